@@ -1,9 +1,17 @@
-from typing import List, Tuple, Set, Dict, Iterator
+from typing import List, Tuple, Set, Dict, Iterator, Sequence, Callable
 from colorama import Fore, Style
+from array import array
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
 import heapq
 import copy
 import math
+import mmap
+import os
 import random
+import struct
+import time
 
 
 # Класс ошибки маршрута.
@@ -71,16 +79,631 @@ class Graph:
         return self.matrix[row][col]
 
 
+# Компактный граф-сетка. В отличие от "Graph" не создает объект на каждую ячейку: стоимости ячеек хранятся в одном
+# плоском буфере "array" по индексу row * cols + col, а соседи вычисляются на лету индексной арифметикой.
+# Нулевые ячейки считаются запретными для прохода.
+class GridGraph:
+
+    def __init__(self, matrix: List[List[int | float]] = None) -> None:
+        matrix = matrix if matrix else []
+        self.rows: int = len(matrix)  # Количество строк матрицы.
+        self.cols: int = len(matrix[0]) if matrix else 0  # Количество столбцов матрицы.
+        self.costs: Sequence[int | float] = array('d')  # Плоский буфер стоимостей ячеек.
+        for row in matrix:
+            self.costs.extend(row)
+        self.size: int = self.rows * self.cols  # Общее количество ячеек.
+        self._min_cost: float | None = None
+        self._uniform_cost: float | None = None
+        self._uniform_known: bool = False  # Проверена ли одинаковость стоимостей ячеек.
+
+    # Создание сетки поверх уже готового плоского буфера стоимостей (без копирования).
+    @classmethod
+    def from_costs(cls, costs: Sequence[int | float], rows: int, cols: int) -> 'GridGraph':
+        grid = cls.__new__(cls)
+        grid.rows, grid.cols, grid.size = rows, cols, rows * cols
+        grid.costs = costs
+        grid._min_cost = None
+        grid._uniform_cost, grid._uniform_known = None, False
+        return grid
+
+    # Плоский индекс ячейки по индексам строки и столбца. Отрицательные индексы отсчитываются с конца, как в списках.
+    def index(self, row: int, col: int) -> int:
+        if row < 0:
+            row += self.rows
+        if col < 0:
+            col += self.cols
+        if not (0 <= row < self.rows and 0 <= col < self.cols):
+            raise IndexError
+        return row * self.cols + col
+
+    # Индексы строки и столбца по плоскому индексу.
+    def indexes(self, index: int) -> Tuple[int, int]:
+        return divmod(index, self.cols)
+
+    # Минимальная стоимость проходимой ячейки. Используется как множитель допустимой эвристики.
+    @property
+    def min_cost(self) -> float:
+        if self._min_cost is None:
+            self._min_cost = min((value for value in self.costs if value > 0), default=1)
+        return self._min_cost
+
+    # Стоимость проходимых ячеек, если она у всех одинакова, иначе None.
+    @property
+    def uniform_cost(self) -> float | None:
+        if not self._uniform_known:
+            self._uniform_cost = None
+            for value in self.costs:
+                if value and value != self._uniform_cost:
+                    if self._uniform_cost is not None:
+                        self._uniform_cost = None
+                        break
+                    self._uniform_cost = value
+            self._uniform_known = True
+        return self._uniform_cost
+
+    # Изменение стоимости ячейки (0 - ячейка становится запретной для прохода).
+    def set_value(self, row: int, col: int, value: int | float) -> None:
+        index = self.index(row, col)
+        old_value, self.costs[index] = self.costs[index], value
+        self._uniform_known = False
+        if self._min_cost is not None:
+            if 0 < value < self._min_cost:
+                self._min_cost = value
+            elif old_value == self._min_cost and value != old_value:
+                self._min_cost = None  # Минимум пересчитаем при следующем обращении.
+
+    # Индексы всех соседних ячеек (до 8 штук) в пределах сетки, включая запретные.
+    def adjacent(self, index: int) -> Iterator[int]:
+        cols = self.cols
+        row, col = divmod(index, cols)
+        for new_row in (row - 1, row, row + 1):
+            if 0 <= new_row < self.rows:
+                for new_col in (col - 1, col, col + 1):
+                    if 0 <= new_col < cols and (new_row != row or new_col != col):
+                        yield new_row * cols + new_col
+
+    # Соседи ячейки (до 8 штук) в виде пар (плоский индекс, стоимость). Запретные ячейки пропускаются.
+    def neighbours(self, index: int) -> Iterator[Tuple[int, int | float]]:
+        costs, cols = self.costs, self.cols
+        row, col = divmod(index, cols)
+        for new_row in (row - 1, row, row + 1):
+            if not 0 <= new_row < self.rows:
+                continue
+            base = new_row * cols
+            for new_col in (col - 1, col, col + 1):
+                if 0 <= new_col < cols and (new_row != row or new_col != col):
+                    cost = costs[base + new_col]
+                    if cost:
+                        yield base + new_col, cost
+
+    # Итератор, выдающий строки матрицы.
+    def __iter__(self) -> Iterator[List[int | float]]:
+        for row in range(self.rows):
+            yield list(self.costs[row * self.cols:(row + 1) * self.cols])
+
+    # Выдача стоимости ячейки по индексам.
+    def __getitem__(self, index) -> int | float:
+        row, col = index
+        return self.costs[self.index(row, col)]
+
+    # Сохранение сетки в двоичный файл с разбиением на квадратные плитки (см. "TiledCosts").
+    # Код типа по умолчанию выбирается по данным: самый узкий целый тип, вмещающий все стоимости, или 'd' для
+    # дробных стоимостей. Явно заданный тип, теряющий значения, - ValueError.
+    def save(self, path: str, tile: int = 64, typecode: str = None) -> None:
+        typecode = typecode or self._typecode()
+        convert = float if typecode in 'fd' else int
+        with open(path, 'wb') as file:
+            header = TiledCosts.HEADER.pack(TiledCosts.MAGIC, typecode.encode(), self.rows, self.cols, tile,
+                                            self.min_cost)
+            file.write(header.ljust(TiledCosts.DATA_OFFSET, b'\0'))
+            for tile_row in range(0, self.rows, tile):
+                for tile_col in range(0, self.cols, tile):
+                    block = array(typecode, [0]) * (tile * tile)  # Крайние плитки дополняются нулями.
+                    width = min(tile, self.cols - tile_col)
+                    for row in range(tile_row, min(tile_row + tile, self.rows)):
+                        begin = row * self.cols + tile_col
+                        offset = (row - tile_row) * tile
+                        values = self.costs[begin:begin + width]
+                        try:
+                            stored = array(typecode, map(convert, values))
+                        except OverflowError:
+                            stored = None
+                        if stored is None or stored.tolist() != list(values):
+                            file.close()
+                            os.remove(path)
+                            raise ValueError(f"Стоимости сетки не представимы в типе '{typecode}' без потерь")
+                        block[offset:offset + width] = stored
+                    block.tofile(file)
+
+    # Самый компактный код типа "array", без потерь хранящий стоимости сетки.
+    def _typecode(self) -> str:
+        if not all(float(value).is_integer() for value in self.costs):
+            return 'd'
+        largest = max(self.costs, default=0)
+        for typecode in 'BHIQ':
+            if largest < 256 ** array(typecode).itemsize:
+                return typecode
+        return 'd'
+
+    # Открытие сетки из файла через "mmap": файл не читается целиком, страницы подгружаются по мере обращения
+    # поиска к ячейкам. При "writable" изменения ячеек записываются прямо в файл.
+    @classmethod
+    def load(cls, path: str, writable: bool = False) -> 'GridGraph':
+        costs = TiledCosts(path, writable)
+        grid = cls.from_costs(costs, costs.rows, costs.cols)
+        grid._min_cost = costs.min_cost
+        return grid
+
+
+# Стоимости ячеек в файле, отображенном в память. Ячейки хранятся плитками tile x tile фиксированной ширины: соседние
+# по вертикали ячейки лежат рядом, поэтому поиск, раскрывающий компактную область, затрагивает немного страниц.
+# Формат файла: заголовок (сигнатура, код типа "array", строки, столбцы, размер плитки, минимальная стоимость),
+# дополненный до DATA_OFFSET, затем плитки построчно. Снаружи объект ведет себя как плоский буфер с индексом
+# row * cols + col.
+class TiledCosts:
+    MAGIC = b'GRD1'
+    HEADER = struct.Struct('<4sc3xqqqd')
+    DATA_OFFSET = 4096  # Данные начинаются с границы страницы.
+
+    def __init__(self, path: str, writable: bool = False) -> None:
+        with open(path, 'r+b' if writable else 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        self.path: str = path
+        magic, typecode, self.rows, self.cols, self.tile, self.min_cost = self.HEADER.unpack_from(self.map)
+        if magic != self.MAGIC:
+            raise ValueError("Файл не является файлом сетки")
+        self.cells = memoryview(self.map)[self.DATA_OFFSET:].cast(typecode.decode())
+        self.tiles_per_row: int = -(-self.cols // self.tile)
+
+    # Смещение ячейки в файле (в ячейках) по плоскому индексу.
+    def _offset(self, index: int) -> int:
+        tile = self.tile
+        row, col = divmod(index, self.cols)
+        tile_row, inner_row = divmod(row, tile)
+        tile_col, inner_col = divmod(col, tile)
+        return ((tile_row * self.tiles_per_row + tile_col) * tile + inner_row) * tile + inner_col
+
+    def __getitem__(self, index: int | slice) -> int | float | List[int | float]:
+        if isinstance(index, slice):
+            return [self.cells[self._offset(i)] for i in range(*index.indices(len(self)))]
+        return self.cells[self._offset(index)]
+
+    def __setitem__(self, index: int, value: int | float) -> None:
+        self.cells[self._offset(index)] = value
+        if 0 < value < self.min_cost:  # Минимальная стоимость в заголовке должна оставаться верной.
+            self.min_cost = value
+            struct.pack_into('<d', self.map, self.HEADER.size - 8, value)
+
+    def __len__(self) -> int:
+        return self.rows * self.cols
+
+    def __iter__(self) -> Iterator[int | float]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def close(self) -> None:
+        self.cells.release()
+        self.map.close()
+
+
+# Планировщик путей, многократно отвечающий на запросы по одной построенной сетке.
+# Состояние поиска хранится в плоских массивах, выделяемых один раз. Вместо обнуления массивов перед каждым запросом
+# используются отметки поколений: значение в "g_score"/"came_from" действительно, только если отметка ячейки
+# совпадает с номером текущего запроса. Поэтому подготовка запроса занимает время, пропорциональное числу
+# затронутых ячеек, а не размеру карты.
+# Для сетки из файла ("GridGraph.load") плотные массивы заняли бы около 20 байт на каждую ячейку карты, поэтому
+# состояние поиска хранится в словарях, которые создаются заново для каждого запроса и содержат только
+# затронутые ячейки.
+class PathPlanner:
+
+    def __init__(self, matr: List[List[int]] | GridGraph, landmarks: 'Landmarks' = None) -> None:
+        self.graph = matr if isinstance(matr, GridGraph) else GridGraph(matr)
+        self.landmarks = landmarks  # Предрасчитанные ориентиры для эвристики ALT (необязательно).
+        self.sparse: bool = getattr(self.graph.costs, 'path', None) is not None  # Сетка в файле.
+        self.g_score: Sequence[float] | Dict[int, float] = {}  # Стоимость пути от начального узла.
+        self.came_from: Sequence[int] | Dict[int, int] = {}  # Предыдущие узлы оптимального пути.
+        self.stamps: Sequence[int] | Dict[int, int] = defaultdict(int)  # Отметки поколений ячеек.
+        if not self.sparse:
+            self.g_score = array('d', [0]) * self.graph.size
+            self.came_from = array('q', [-1]) * self.graph.size
+            self.stamps = array('I', [0]) * self.graph.size
+        self.generation: int = 0  # Номер текущего запроса.
+        self.expanded: int = 0  # Количество раскрытых узлов при последнем поиске.
+
+    # Эвристическая функция для оценки расстояния от узла до цели.
+    # Оценка Чебышёва: при 8-связном движении это минимальное число шагов до цели, поэтому, умноженная на
+    # минимальную стоимость ячейки, она не переоценивает путь.
+    @staticmethod
+    def heuristic(node: Tuple[int, int], goal: Tuple[int, int]) -> int:
+        return max(abs(node[0] - goal[0]), abs(node[1] - goal[1]))
+
+    # Оценка расстояния до цели по плоскому индексу: ALT, если заданы ориентиры, иначе оценка Чебышёва.
+    def _estimate_for(self, goal: int) -> Callable[[int], float]:
+        if self.landmarks is not None:
+            return self.landmarks.heuristic_for(goal)
+        cols, weight = self.graph.cols, self.graph.min_cost
+        goal_row, goal_col = divmod(goal, cols)
+
+        def estimate(index: int) -> float:
+            row, col = divmod(index, cols)
+            return max(abs(row - goal_row), abs(col - goal_col)) * weight
+
+        return estimate
+
+    # Оценка стоимости пути от "source" до узла (для обратного поиска). Стоимости несимметричны (платим за ячейку,
+    # в которую входим), поэтому с ориентирами нужна своя оценка; оценка Чебышёва симметрична.
+    def _estimate_from(self, source: int) -> Callable[[int], float]:
+        if self.landmarks is not None:
+            return self.landmarks.heuristic_from(source)
+        return self._estimate_for(source)
+
+    # Начало нового запроса: вместо очистки массивов увеличиваем номер поколения.
+    def _next_generation(self) -> int:
+        self.generation += 1
+        if self.sparse:  # Словари не переиспользуются: память старого запроса освобождается.
+            self.g_score, self.came_from, self.stamps = {}, {}, defaultdict(int)
+        if self.generation >= 2 ** 32:  # Переполнение счетчика: один раз честно сбрасываем отметки.
+            self.stamps = array('I', [0]) * self.graph.size
+            self.generation = 1
+        return self.generation
+
+    # Поиск пути между плоскими индексами. Возвращает True, если цель достигнута.
+    def _search(self, start: int, goal: int) -> bool:
+        graph = self.graph
+        generation = self._next_generation()
+        g_score, came_from, stamps = self.g_score, self.came_from, self.stamps
+        estimate = self._estimate_for(goal)
+        open_set: List[Tuple[float, float, int]] = []  # Куча, в которой будут храниться непосещенные вершины графа.
+        stamps[start], g_score[start], came_from[start] = generation, 0, -1
+        heapq.heappush(open_set, (0, 0, start))  # Создаем кучу и добавляем в нее начальный узел.
+        self.expanded = 0
+
+        while open_set:
+            current_g: float  # Стоимость пути от начального узла до текущего.
+            current_node: int  # Плоский индекс ячейки.
+            _, current_g, current_node = heapq.heappop(
+                open_set)  # Извлекаем узел с наименьшей стоимостью из открытого множества кучи.
+            if current_node == goal:  # Если текущий узел равен целевому, завершаем поиск.
+                return True
+
+            if current_g > g_score[current_node]:  # Устаревшая запись кучи: узел уже раскрыт с лучшей стоимостью.
+                continue
+            self.expanded += 1
+
+            # Просматриваем соседние узлы текущего узла.
+            for neighbor, value in graph.neighbours(current_node):
+                cost: int | float = current_g + value  # Вычисляем стоимость пути до соседа.
+                if stamps[neighbor] != generation or cost < g_score[neighbor]:
+                    stamps[neighbor], g_score[neighbor], came_from[neighbor] = generation, cost, current_node
+                    total_cost: int | float = cost + estimate(neighbor)
+                    # Вычисляем общую стоимость (стоимость пути + эвристическая оценка).
+                    heapq.heappush(open_set, (total_cost, cost, neighbor))  # Добавляем соседа в открытое множество с
+                    # общей стоимостью.
+        return False
+
+    # Восстановление оптимального пути от стартовой ячейки до "index" по массиву "came_from".
+    def get_path(self, index: int) -> List[Tuple[int, int]]:
+        path: List[Tuple[int, int]] = []
+        while index != -1:
+            path.append(self.graph.indexes(index))
+            index = self.came_from[index]
+        path.reverse()
+        return path
+
+    # Поиск оптимального пути. Возвращает путь и его стоимость (включая стоимость стартовой ячейки).
+    # Режимы: "astar" - A*, "bidirectional" - двунаправленный A*, "jps" - Jump Point Search (на сетках с разной
+    # стоимостью ячеек выполняется обычный A*). Все режимы дают одинаковую стоимость пути.
+    def find_path(self, start: Tuple[int, int], goal: Tuple[int, int],
+                  mode: str = 'astar') -> Tuple[List[Tuple[int, int]], float]:
+        start_index = self.graph.index(*start)
+        goal_index = self.graph.index(*goal)  # Индекс за пределами графа - IndexError.
+        if not self.graph.costs[goal_index]:  # Конечная ячейка не может быть равной нулю.
+            raise TypeError
+        if mode not in ('astar', 'bidirectional', 'jps'):
+            raise ValueError(f"Неизвестный режим поиска: {mode}")
+        if mode == 'astar' or mode == 'jps' and self.graph.uniform_cost is None:
+            if not self._search(start_index, goal_index):  # Стартовая и конечная ячейки не связаны маршрутом.
+                raise RouteError
+            return self.get_path(goal_index), self.graph.costs[start_index] + self.g_score[goal_index]
+        if mode == 'jps':
+            result = self._search_jps(start_index, goal_index, self.graph.uniform_cost)
+        else:
+            result = self._search_bidirectional(start_index, goal_index)
+        if result is None:
+            raise RouteError
+        path, cost = result
+        return [self.graph.indexes(index) for index in path], self.graph.costs[start_index] + cost
+
+    # Двунаправленный A*: прямой поиск от старта и обратный от цели, на каждом шаге раскрывается сторона с меньшей
+    # кучей. Поиск останавливается, когда минимальная оценка любой из куч не меньше лучшего найденного пути через
+    # точку встречи: при допустимых эвристиках более короткого пути уже не существует.
+    def _search_bidirectional(self, start: int, goal: int) -> Tuple[List[int], float] | None:
+        graph = self.graph
+        costs = graph.costs
+        estimates = (self._estimate_for(goal), self._estimate_from(start))  # Обратный поиск оценивает путь от старта.
+        g_scores: Tuple[Dict[int, float], Dict[int, float]] = ({start: 0}, {goal: 0})
+        came_from: Tuple[Dict[int, int], Dict[int, int]] = ({start: -1}, {goal: -1})
+        open_sets = ([(0, 0, start)], [(0, 0, goal)])  # Как и в "_search", начальные узлы без оценки: стартовая
+        # ячейка может быть запретной, и ориентиры из нее недостижимы.
+        best, meeting = (0, start) if start == goal else (math.inf, -1)
+        self.expanded = 0
+
+        while open_sets[0] and open_sets[1]:
+            if open_sets[0][0][0] >= best or open_sets[1][0][0] >= best:
+                break
+            side = 0 if len(open_sets[0]) <= len(open_sets[1]) else 1
+            _, current_g, current_node = heapq.heappop(open_sets[side])
+            if current_g > g_scores[side][current_node]:
+                continue
+            self.expanded += 1
+            if side == 0:
+                edges = graph.neighbours(current_node)
+            elif costs[current_node]:  # Обратное ребро u <- v стоит столько же, сколько вход в v.
+                edges = ((neighbor, costs[current_node]) for neighbor in graph.adjacent(current_node)
+                         if costs[neighbor] or neighbor == start)
+            else:
+                continue
+            own, other = g_scores[side], g_scores[1 - side]
+            for neighbor, value in edges:
+                cost = current_g + value
+                if cost < own.get(neighbor, math.inf):
+                    own[neighbor], came_from[side][neighbor] = cost, current_node
+                    heapq.heappush(open_sets[side], (cost + estimates[side](neighbor), cost, neighbor))
+                    if cost + other.get(neighbor, math.inf) < best:
+                        best, meeting = cost + other[neighbor], neighbor
+
+        if meeting == -1:
+            return None
+        path, index = [], meeting
+        while index != -1:
+            path.append(index)
+            index = came_from[0][index]
+        path.reverse()
+        index = came_from[1][meeting]
+        while index != -1:
+            path.append(index)
+            index = came_from[1][index]
+        return path, best
+
+    # Jump Point Search для сеток с одинаковой стоимостью проходимых ячеек. Из каждой точки поиск "прыгает" по
+    # прямой или диагонали, пропуская симметричные пути, и останавливается только в точках с вынужденными
+    # соседями, поэтому в кучу попадают лишь такие точки.
+    def _search_jps(self, start: int, goal: int, cost: float) -> Tuple[List[int], float] | None:
+        graph = self.graph
+        rows, cols, costs = graph.rows, graph.cols, graph.costs
+        goal_row, goal_col = divmod(goal, cols)
+
+        def passable(row: int, col: int) -> bool:
+            return 0 <= row < rows and 0 <= col < cols and bool(costs[row * cols + col])
+
+        # Прыжок из (row, col) в направлении (dr, dc). Возвращает точку прыжка или None.
+        def jump(row: int, col: int, dr: int, dc: int) -> Tuple[int, int] | None:
+            while True:
+                row, col = row + dr, col + dc
+                if not passable(row, col):
+                    return None
+                if row == goal_row and col == goal_col:
+                    return row, col
+                if dr and dc:
+                    if (not passable(row - dr, col) and passable(row - dr, col + dc) or
+                            not passable(row, col - dc) and passable(row + dr, col - dc)):
+                        return row, col
+                    if jump(row, col, dr, 0) or jump(row, col, 0, dc):
+                        return row, col
+                elif dr:
+                    if (not passable(row, col + 1) and passable(row + dr, col + 1) or
+                            not passable(row, col - 1) and passable(row + dr, col - 1)):
+                        return row, col
+                elif (not passable(row + 1, col) and passable(row + 1, col + dc) or
+                      not passable(row - 1, col) and passable(row - 1, col + dc)):
+                    return row, col
+
+        # Направления, в которых продолжается поиск из точки, достигнутой из "parent".
+        def directions(row: int, col: int, parent: int) -> List[Tuple[int, int]]:
+            if parent == -1:
+                return [(dr, dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1) if dr or dc]
+            parent_row, parent_col = divmod(parent, cols)
+            dr, dc = (row > parent_row) - (row < parent_row), (col > parent_col) - (col < parent_col)
+            if dr and dc:
+                result = [(dr, 0), (0, dc), (dr, dc)]
+                if not passable(row - dr, col):
+                    result.append((-dr, dc))
+                if not passable(row, col - dc):
+                    result.append((dr, -dc))
+            elif dr:
+                result = [(dr, 0)] + [(dr, side) for side in (-1, 1) if not passable(row, col + side)]
+            else:
+                result = [(0, dc)] + [(side, dc) for side in (-1, 1) if not passable(row + side, col)]
+            return result
+
+        estimate = self._estimate_for(goal)
+        g_score, came_from = {start: 0}, {start: -1}
+        open_set = [(estimate(start), 0, start)]
+        self.expanded = 0
+        while open_set:
+            _, current_g, current_node = heapq.heappop(open_set)
+            if current_node == goal:
+                break
+            if current_g > g_score[current_node]:
+                continue
+            self.expanded += 1
+            row, col = divmod(current_node, cols)
+            for dr, dc in directions(row, col, came_from[current_node]):
+                point = jump(row, col, dr, dc)
+                if point is None:
+                    continue
+                index = point[0] * cols + point[1]
+                new_g = current_g + max(abs(point[0] - row), abs(point[1] - col)) * cost
+                if new_g < g_score.get(index, math.inf):
+                    g_score[index], came_from[index] = new_g, current_node
+                    heapq.heappush(open_set, (new_g + estimate(index), new_g, index))
+        else:
+            return None
+
+        # Восстановление пути с заполнением ячеек между точками прыжков.
+        points, index = [], goal
+        while index != -1:
+            points.append(index)
+            index = came_from[index]
+        points.reverse()
+        path = [start]
+        for point in points[1:]:
+            row, col = divmod(path[-1], cols)
+            end_row, end_col = divmod(point, cols)
+            dr, dc = (end_row > row) - (end_row < row), (end_col > col) - (end_col < col)
+            while (row, col) != (end_row, end_col):
+                row, col = row + dr, col + dc
+                path.append(row * cols + col)
+        return path, g_score[goal]
+
+    # Пакетный поиск путей для списка пар (старт, цель). Для несвязанных пар возвращается пустой путь и
+    # бесконечная стоимость.
+    def find_paths(self, pairs: Sequence[Tuple[Tuple[int, int], Tuple[int, int]]], mode: str = 'astar'
+                   ) -> List[Tuple[List[Tuple[int, int]], float]]:
+        result = []
+        for start, goal in pairs:
+            try:
+                result.append(self.find_path(start, goal, mode))
+            except (RouteError, TypeError):
+                result.append(([], math.inf))
+        return result
+
+
+# Ориентиры для эвристики ALT. Для нескольких ячеек-ориентиров L заранее считаются точные стоимости путей от
+# ориентира до каждой ячейки и от каждой ячейки до ориентира. По неравенству треугольника
+# d(v, t) >= d(L, t) - d(L, v) и d(v, t) >= d(v, L) - d(t, L), что дает оценку, учитывающую стоимости ячеек.
+# Предрасчет сохраняется в файл, чтобы выполнять его один раз для карты; после изменения ячеек его нужно повторить.
+class Landmarks:
+    MAGIC = b'ALT1'
+    HEADER = struct.Struct('<4sqqq')  # Сигнатура, количество строк, столбцов и ориентиров.
+
+    def __init__(self, matr: List[List[int]] | GridGraph, count: int = 8, seed: int = 0) -> None:
+        self.graph = matr if isinstance(matr, GridGraph) else GridGraph(matr)
+        self.landmarks: List[int] = []  # Плоские индексы ячеек-ориентиров.
+        self.from_landmark: List[Sequence[float]] = []  # Стоимости путей от ориентира до ячеек.
+        self.to_landmark: List[Sequence[float]] = []  # Стоимости путей от ячеек до ориентира.
+        passable = [index for index in range(self.graph.size) if self.graph.costs[index]]
+        if not passable:
+            return
+        landmark = random.Random(seed).choice(passable)
+        nearest = array('d', [math.inf]) * self.graph.size  # Стоимость до ближайшего уже выбранного ориентира.
+        while len(self.landmarks) < min(count, len(passable)):
+            self._add(landmark)
+            for index, distance in enumerate(self.from_landmark[-1]):
+                if distance < nearest[index]:
+                    nearest[index] = distance
+            # Следующий ориентир - достижимая ячейка, наиболее удаленная от уже выбранных.
+            landmark = max(passable, key=lambda index: nearest[index] if nearest[index] < math.inf else -1)
+
+    def _add(self, landmark: int) -> None:
+        self.landmarks.append(landmark)
+        self.from_landmark.append(self.distances(self.graph, landmark))
+        self.to_landmark.append(self.distances(self.graph, landmark, reverse=True))
+
+    # Дейкстра по всей сетке. При "reverse" считаются стоимости путей до "source", а не от него.
+    @staticmethod
+    def distances(graph: GridGraph, source: int, reverse: bool = False) -> Sequence[float]:
+        costs = graph.costs
+        distances = array('d', [math.inf]) * graph.size
+        distances[source] = 0
+        open_set = [(0, source)]
+        while open_set:
+            distance, index = heapq.heappop(open_set)
+            if distance > distances[index]:
+                continue
+            step = costs[index]  # При обратном поиске платим за ячейку, из которой выходим.
+            for neighbor, value in graph.neighbours(index):
+                cost = distance + (step if reverse else value)
+                if cost < distances[neighbor]:
+                    distances[neighbor] = cost
+                    heapq.heappush(open_set, (cost, neighbor))
+        return distances
+
+    # Эвристика для конкретной цели. Несогласованные (бесконечные) разности пропускаются, а бесконечная оценка
+    # означает, что цель из ячейки недостижима.
+    def heuristic_for(self, goal: int) -> Callable[[int], float]:
+        cols, weight = self.graph.cols, self.graph.min_cost
+        goal_row, goal_col = divmod(goal, cols)
+        terms = [(from_landmark, to_landmark, from_landmark[goal], to_landmark[goal])
+                 for from_landmark, to_landmark in zip(self.from_landmark, self.to_landmark)]
+
+        def estimate(index: int) -> float:
+            row, col = divmod(index, cols)
+            best = max(abs(row - goal_row), abs(col - goal_col)) * weight
+            for from_landmark, to_landmark, from_goal, to_goal in terms:
+                forward = from_goal - from_landmark[index]
+                backward = to_landmark[index] - to_goal
+                if forward > best:
+                    best = forward
+                if backward > best:
+                    best = backward
+            return best
+
+        return estimate
+
+    # Оценка стоимости пути от "source" до ячейки: d(s, v) >= d(L, v) - d(L, s) и d(s, v) >= d(s, L) - d(v, L).
+    def heuristic_from(self, source: int) -> Callable[[int], float]:
+        cols, weight = self.graph.cols, self.graph.min_cost
+        source_row, source_col = divmod(source, cols)
+        terms = [(from_landmark, to_landmark, from_landmark[source], to_landmark[source])
+                 for from_landmark, to_landmark in zip(self.from_landmark, self.to_landmark)
+                 if self.graph.costs[source]]  # Из запретной стартовой ячейки ориентиры недостижимы - только
+        # оценка Чебышёва.
+
+        def estimate(index: int) -> float:
+            row, col = divmod(index, cols)
+            best = max(abs(row - source_row), abs(col - source_col)) * weight
+            for from_landmark, to_landmark, from_source, to_source in terms:
+                forward = from_landmark[index] - from_source
+                backward = to_source - to_landmark[index]
+                if forward > best:
+                    best = forward
+                if backward > best:
+                    best = backward
+            return best
+
+        return estimate
+
+    # Сохранение предрасчета в двоичный файл.
+    def save(self, path: str) -> None:
+        with open(path, 'wb') as file:
+            file.write(self.HEADER.pack(self.MAGIC, self.graph.rows, self.graph.cols, len(self.landmarks)))
+            array('q', self.landmarks).tofile(file)
+            for distances in (*self.from_landmark, *self.to_landmark):
+                distances.tofile(file)
+
+    # Загрузка предрасчета, сделанного для той же карты.
+    @classmethod
+    def load(cls, path: str, graph: GridGraph) -> 'Landmarks':
+        with open(path, 'rb') as file:
+            magic, rows, cols, count = cls.HEADER.unpack(file.read(cls.HEADER.size))
+            if magic != cls.MAGIC or (rows, cols) != (graph.rows, graph.cols):
+                raise ValueError("Файл ориентиров не соответствует карте")
+            landmarks = cls.__new__(cls)
+            landmarks.graph = graph
+            indexes = array('q')
+            indexes.fromfile(file, count)
+            landmarks.landmarks = list(indexes)
+            tables = []
+            for _ in range(2 * count):
+                distances = array('d')
+                distances.fromfile(file, graph.size)
+                tables.append(distances)
+            landmarks.from_landmark, landmarks.to_landmark = tables[:count], tables[count:]
+        return landmarks
+
+
 # Алгоритм поиска пути.
 class ASearch:
-    def __init__(self, matr: List[List[int]], start_vertex: Tuple[int, int], end_vertex: Tuple[int, int]) -> None:
-        self.graph = Graph(matr)
+    def __init__(self, matr: List[List[int]] | GridGraph, start_vertex: Tuple[int, int],
+                 end_vertex: Tuple[int, int]) -> None:
+        self.graph = matr if isinstance(matr, GridGraph) else GridGraph(matr)  # Уже построенную сетку используем
+        # повторно, без копирования.
         self.start: Tuple[int, int] = start_vertex  # Стартовая вершина поиска.
         self.goal: Tuple[int, int] = end_vertex  # Конечная вершина поиска.
         self.path: List[Tuple[int, int]] = []  # Список, где будут храниться кортежи индексов ячеек оптимального пути.
-        self.came_from: Dict[Tuple[int, int], Tuple[int, int]] = {}  # Cловарь для отслеживания предыдущих узлов в
-        # оптимальном пути.
-        self.travel_cost: int | float = self.graph[start_vertex[0], start_vertex[1]].value  # Стоимость пути от
+        self.expanded: int = 0  # Количество раскрытых узлов при последнем поиске.
+        self.travel_cost: int | float = self.graph[start_vertex[0], start_vertex[1]]  # Стоимость пути от
         # стартовой до целевой ячейки. Первоначально ровняется стоимости стартовой ячейки.
 
     def __call__(self, *args, **kwargs):
@@ -88,7 +711,7 @@ class ASearch:
             self.astar_search()  # Расчет оптимального пути.
             self.show_result()  # Вывод результата на экран.
             print()
-            print(f"\033[33mСтоимость пути: {self.travel_cost} единицы\033[0m")
+            print(f"\033[33mСтоимость пути: {self.travel_cost:g} единицы\033[0m")
         except IndexError:
             print(f"\033[91mИндекс конечной ячейки выходит за пределы графа!\033[0m")
         except TypeError:
@@ -96,78 +719,25 @@ class ASearch:
         except RouteError as e:
             print(f"\033[91m{e.message}\033[0m")
 
-    # Эвристическая функция для оценки расстояния от узла до цели.
-    # Манхеттенская оценка.
-    @staticmethod
-    def heuristic(node: Cell, goal: Tuple[int, int]) -> int:
-        return abs(node.indexes[0] - goal[0]) + abs(node.indexes[1] - goal[1])
+    heuristic = PathPlanner.heuristic
 
-    # Алгоритм поиска.
+    # Алгоритм поиска. Для многократных запросов по одной карте используйте "PathPlanner" напрямую.
     def astar_search(self):
-        self.__valid_type(self.graph[self.goal[0], self.goal[1]].value)  # Проверка, что конечная ячейка не
-        # является нулем.
-        self.__valid_index(self.goal)  # Проверка, что индекс конечной ячейки не выходит за пределы графа.
-        x0, y0 = self.start
-        open_set: List[Tuple[int, int]] = []  # Множество, в котором будут храниться непосещенные вершины графа.
-        closed_set: Set[Tuple[int, int]] = set()  # Множество, в котором хранятся посещенные вершины графа.
-        g_score: Dict[Tuple[int, int], float] = {node.indexes: float('inf') for row in self.graph for node in row}
-        # Словарь для хранения стоимости пути от начального узла до текущего.
-        g_score[(x0, y0)] = 0
-        # стоимости пути от начального узла до данного узла. Изначально стоимости полагаем равными бесконечности.
-        heapq.heappush(open_set, (self.graph[x0, y0].value, self.graph[x0, y0].indexes))  # Создаем кучу и добавляем
-        # в нее начальный узел.
-
-        while open_set:
-            current_cost: int  # Значение ячейки матрицы.
-            current_node: Tuple[int, int]  # Индексы ячейки матрицы.
-            x: int  # Индекс строки в матрице.
-            y: int  # Индекс столбца в матрице.
-            current_cost, current_node = heapq.heappop(
-                open_set)  # Извлекаем узел с наименьшей стоимостью из открытого множества кучи.
-            x, y = current_node
-            if current_node == self.goal:  # Если текущий узел равен целевому, завершаем поиск.
-                self.get_path(current_node)
-                break
-
-            if current_node in closed_set:  # Если текущий узел уже был посещен, пропускаем его.
-                continue
-
-            closed_set.add((x, y))  # Добавляем текущий узел в закрытое множество.
-
-            # Просматриваем соседние узлы текущего узла.
-            for neighbor in self.graph[x, y].neighbours:
-                cost: int | float = current_cost + neighbor.value  # Вычисляем стоимость пути до соседа.
-                if cost < g_score[neighbor.indexes]:
-                    g_score[neighbor.indexes]: int | float = cost
-                    total_cost: int | float = cost + self.heuristic(neighbor, self.goal)  # Вычисляем общую стоимость
-                    # (стоимость пути + эвристическая оценка).
-                    heapq.heappush(open_set,
-                                   (total_cost, neighbor.indexes))  # Добавляем соседа в открытое множество с общей
-                    # стоимостью.
-                    self.came_from[neighbor.indexes]: Tuple[int, int] = (x, y)
-
-        # Стартовая и конечная ячейки не связаны маршрутом.
-        if not self.goal in self.came_from:
-            raise RouteError
-
-    # Восстановление оптимального пути.
-    def get_path(self, current_node: Tuple[int, int]) -> None:
-        self.path: List[Tuple[int, int]] = [self.start]
-        while current_node in self.came_from:
-            self.path.insert(1, current_node)
-            self.travel_cost += self.graph[current_node[0], current_node[1]].value  # Стоимость пути
-            current_node: Tuple[int, int] = self.came_from[current_node]
+        planner = PathPlanner(self.graph)
+        self.path, self.travel_cost = planner.find_path(self.start, self.goal)
+        self.expanded = planner.expanded
 
     # Вывод результата на экран.
     def show_result(self):
-        matrix = [[col.value if col.value != float(math.inf) else 0 for col in row] for row in self.graph.matrix]
+        matrix = [[int(col) if col == int(col) else col for col in row] for row in self.graph]
         column_widths = [max(len(str(row[i])) for row in matrix) for i in range(len(matrix[0]))]
         column_padding = 1
+        path = set(self.path)
 
         for i in range(len(matrix)):
             row_str = ""
             for j in range(len(matrix[i])):
-                if (i, j) in self.path:
+                if (i, j) in path:
                     row_str += Fore.GREEN + str(matrix[i][j]) + " " + Style.RESET_ALL
                 else:
                     row_str += str(matrix[i][j]) + " "
@@ -175,27 +745,541 @@ class ASearch:
                 row_str = f"{' ' * (padding // 2)}{row_str}{' ' * (padding - padding // 2 + column_padding)}"
             print(row_str)
 
-    # Проверка, что конечная ячейка не является нулем.
-    @staticmethod
-    def __valid_type(vertex):
-        if vertex == float(math.inf):
+
+# Инкрементальный планировщик (D* Lite). Поиск ведется от цели к старту, поэтому после изменения ячеек
+# пересчитываются только вершины, оценки которых затронуты изменением, а не вся карта. Старт может смещаться
+# вдоль пути по мере движения агента.
+class IncrementalPlanner:
+
+    def __init__(self, matr: List[List[int]] | GridGraph, start_vertex: Tuple[int, int],
+                 end_vertex: Tuple[int, int]) -> None:
+        self.graph = matr if isinstance(matr, GridGraph) else GridGraph(matr)
+        self.start: int = self.graph.index(*start_vertex)  # Текущее положение агента.
+        self.goal: int = self.graph.index(*end_vertex)
+        if not self.graph.costs[self.goal]:  # Конечная ячейка не может быть равной нулю.
             raise TypeError
+        self.expanded: int = 0  # Количество раскрытых узлов при последнем пересчете.
+        self._reset()
 
-    # Проверка, что индекс конечной ячейки не выходит за пределы графа.
-    def __valid_index(self, indexes):
-        f = self.graph[-1, -1].indexes
-        if abs(indexes[0]) > f[0] or abs(indexes[1]) > f[1]:
-            raise IndexError
+    # Исходное состояние D* Lite: оценки g и rhs хранятся только для затронутых ячеек.
+    def _reset(self) -> None:
+        self.weight: float = self.graph.min_cost  # Множитель эвристики, фиксированный до следующего сброса.
+        self.g_score: Dict[int, float] = {}
+        self.rhs: Dict[int, float] = {self.goal: 0}
+        self.km: float = 0  # Накопленная поправка ключей при смещении старта.
+        self.last: int = self.start
+        self.open_set: List[Tuple[float, float, int]] = []
+        self.open_keys: Dict[int, Tuple[float, float]] = {}  # Актуальные ключи вершин, находящихся в куче.
+        self._push(self.goal)
+
+    def _heuristic(self, a: int, b: int) -> float:
+        (ra, ca), (rb, cb) = divmod(a, self.graph.cols), divmod(b, self.graph.cols)
+        return max(abs(ra - rb), abs(ca - cb)) * self.weight
+
+    def _key(self, index: int) -> Tuple[float, float]:
+        best = min(self.g_score.get(index, math.inf), self.rhs.get(index, math.inf))
+        return best + self._heuristic(self.start, index) + self.km, best
+
+    def _push(self, index: int) -> None:
+        key = self._key(index)
+        self.open_keys[index] = key
+        heapq.heappush(self.open_set, (*key, index))
+
+    # Верхушка кучи без устаревших записей.
+    def _top_key(self) -> Tuple[float, float]:
+        open_set = self.open_set
+        while open_set and self.open_keys.get(open_set[0][2]) != open_set[0][:2]:
+            heapq.heappop(open_set)
+        return open_set[0][:2] if open_set else (math.inf, math.inf)
+
+    # Пересчет rhs вершины по ее проходимым соседям и постановка в очередь, если вершина несогласована.
+    def _update_vertex(self, index: int) -> None:
+        if index != self.goal:
+            g_score = self.g_score
+            self.rhs[index] = min((cost + g_score.get(neighbor, math.inf)
+                                   for neighbor, cost in self.graph.neighbours(index)), default=math.inf)
+        if self.g_score.get(index, math.inf) != self.rhs.get(index, math.inf):
+            self._push(index)
+        else:
+            self.open_keys.pop(index, None)
+
+    def _compute_shortest_path(self) -> None:
+        g_score, rhs = self.g_score, self.rhs
+        self.expanded = 0
+        while (self._top_key() < self._key(self.start) or
+               rhs.get(self.start, math.inf) != g_score.get(self.start, math.inf)):
+            k_old1, k_old2, index = heapq.heappop(self.open_set)
+            del self.open_keys[index]
+            k_new = self._key(index)
+            if (k_old1, k_old2) < k_new:
+                self.open_keys[index] = k_new
+                heapq.heappush(self.open_set, (*k_new, index))
+                continue
+            self.expanded += 1
+            if g_score.get(index, math.inf) > rhs.get(index, math.inf):
+                g_score[index] = rhs[index]
+            else:
+                g_score[index] = math.inf
+                self._update_vertex(index)
+            for neighbor in self.graph.adjacent(index):  # Вершины, ведущие в данную.
+                self._update_vertex(neighbor)
+
+    # Пересчет пути (затрагивает только несогласованные вершины) и его восстановление от старта к цели.
+    def find_path(self) -> Tuple[List[Tuple[int, int]], float]:
+        self._compute_shortest_path()
+        g_score, graph = self.g_score, self.graph
+        if g_score.get(self.start, math.inf) == math.inf:  # Стартовая и конечная ячейки не связаны маршрутом.
+            raise RouteError
+        index, path = self.start, [graph.indexes(self.start)]
+        while index != self.goal:
+            index = min(graph.neighbours(index), key=lambda item: item[1] + g_score.get(item[0], math.inf))[0]
+            path.append(graph.indexes(index))
+        return path, graph.costs[self.start] + g_score[self.start]
+
+    # Изменение стоимости ячейки (0 - ячейка становится запретной). Меняются стоимости переходов в эту ячейку,
+    # поэтому обновляются оценки ее соседей.
+    def update_cell(self, row: int, col: int, new_value: int | float) -> None:
+        self.graph.set_value(row, col, new_value)
+        if 0 < new_value < self.weight:  # Эвристика перестала быть допустимой - начинаем поиск заново.
+            self._reset()
+            return
+        for neighbor in self.graph.adjacent(self.graph.index(row, col)):
+            self._update_vertex(neighbor)
+
+    # Перемещение агента в новую стартовую ячейку.
+    def move_to(self, row: int, col: int) -> None:
+        self.start = self.graph.index(row, col)
+        self.km += self._heuristic(self.last, self.start)
+        self.last = self.start
+
+
+# Иерархический планировщик (HPA*). Сетка делится на кластеры, на общих границах соседних кластеров выбираются
+# входы, а стоимости переходов между входами внутри кластера рассчитываются заранее. Поиск идет по абстрактному
+# графу входов, после чего детально прокладываются только нужные участки внутри кластеров. Путь близок к
+# оптимальному; отклонение можно оценить методом "optimality_gap".
+class HierarchicalPlanner:
+    ENTRANCE_SPLIT = 6  # Длина прохода по границе, начиная с которой вместо одного входа ставятся два по краям.
+    START, GOAL = -1, -2  # Временные абстрактные вершины для старта и цели запроса.
+
+    def __init__(self, matr: List[List[int]] | GridGraph, cluster_size: int = 16) -> None:
+        self.graph = matr if isinstance(matr, GridGraph) else GridGraph(matr)
+        self.cluster_size: int = cluster_size
+        self.cluster_rows: int = -(-self.graph.rows // cluster_size)  # Количество кластеров по вертикали.
+        self.cluster_cols: int = -(-self.graph.cols // cluster_size)  # Количество кластеров по горизонтали.
+        self.transitions: Dict[Tuple[int, int], List[Tuple[int, int]]] = {}  # Пары ячеек-входов на границе
+        # двух соседних кластеров.
+        self.links: Dict[int, Set[int]] = {}  # Переходы через границы кластеров (стоимость - значение ячейки).
+        self.cluster_nodes: Dict[int, Set[int]] = {}  # Входы каждого кластера.
+        self.intra: Dict[int, Dict[int, float]] = {}  # Стоимости переходов между входами одного кластера.
+        self.expanded: int = 0  # Количество раскрытых узлов при последнем запросе (абстрактных и детальных).
+        for cluster in range(self.cluster_rows * self.cluster_cols):
+            for border in self._borders(cluster):
+                if border not in self.transitions:
+                    self._build_border(border)
+        for cluster in range(self.cluster_rows * self.cluster_cols):
+            self._build_cluster(cluster)
+
+    def cluster_of(self, index: int) -> int:
+        row, col = divmod(index, self.graph.cols)
+        return row // self.cluster_size * self.cluster_cols + col // self.cluster_size
+
+    # Границы кластера в виде (первая строка, первый столбец, строка за последней, столбец за последним).
+    def bounds(self, cluster: int) -> Tuple[int, int, int, int]:
+        row, col = divmod(cluster, self.cluster_cols)
+        size = self.cluster_size
+        return (row * size, col * size, min((row + 1) * size, self.graph.rows),
+                min((col + 1) * size, self.graph.cols))
+
+    # Границы кластера со всеми соседними кластерами (включая соседей по диагонали, через которые можно пройти
+    # углом). Граница - пара (кластер с меньшим номером, кластер с большим номером).
+    def _borders(self, cluster: int) -> Iterator[Tuple[int, int]]:
+        row, col = divmod(cluster, self.cluster_cols)
+        for new_row in (row - 1, row, row + 1):
+            for new_col in (col - 1, col, col + 1):
+                if (0 <= new_row < self.cluster_rows and 0 <= new_col < self.cluster_cols and
+                        (new_row, new_col) != (row, col)):
+                    other = new_row * self.cluster_cols + new_col
+                    yield min(cluster, other), max(cluster, other)
+
+    # Поиск входов на границе двух кластеров. На прямой границе непрерывные участки, где проходимы обе ячейки по
+    # разные стороны, дают один или два входа. Диагональные переходы добавляются, только если их ячейки не
+    # связаны с прямыми входами, - так абстрактный граф сохраняет связность исходной сетки.
+    def _build_border(self, border: Tuple[int, int]) -> None:
+        for a, b in self.transitions.pop(border, ()):
+            self.links[a].discard(b)
+            self.links[b].discard(a)
+        graph, (first, second) = self.graph, border
+        costs, cols = graph.costs, graph.cols
+        r0, c0, r1, c1 = self.bounds(first)
+        s0, t0, s1, t1 = self.bounds(second)
+        if r0 == s0:  # Вертикальная граница: последний столбец левого кластера и первый столбец правого.
+            lines = [(row * cols + c1 - 1, row * cols + t0) for row in range(r0, r1)]
+        elif c0 == t0:  # Горизонтальная граница: последняя строка верхнего кластера и первая строка нижнего.
+            lines = [((r1 - 1) * cols + col, s0 * cols + col) for col in range(c0, c1)]
+        else:  # Соседство углами.
+            corner = (r1 - 1) * cols + (c1 - 1 if t0 > c0 else c0)
+            lines = [(corner, s0 * cols + (t0 if t0 > c0 else t1 - 1))]
+        straight = [bool(costs[a] and costs[b]) for a, b in lines]
+        transitions, run = [], []
+        for (a, b), passable in zip(lines + [(None, None)], straight + [False]):
+            if passable:
+                run.append((a, b))
+                continue
+            if run:
+                if len(run) >= self.ENTRANCE_SPLIT:
+                    transitions.extend((run[0], run[-1]))
+                else:
+                    transitions.append(run[len(run) // 2])
+                run = []
+        if len(lines) > 1:
+            for number, (a, _) in enumerate(lines):
+                for other in (number - 1, number + 1):
+                    if not 0 <= other < len(lines):
+                        continue
+                    b = lines[other][1]
+                    if costs[a] and costs[b] and not straight[number] and not straight[other]:
+                        transitions.append((a, b))
+        self.transitions[border] = transitions
+        for a, b in transitions:
+            self.links.setdefault(a, set()).add(b)
+            self.links.setdefault(b, set()).add(a)
+
+    # Перерасчет входов кластера и стоимостей переходов между ними.
+    def _build_cluster(self, cluster: int) -> None:
+        for node in self.cluster_nodes.pop(cluster, ()):
+            self.intra.pop(node, None)
+        nodes = {index for border in self._borders(cluster) for pair in self.transitions.get(border, ())
+                 for index in pair if self.cluster_of(index) == cluster}
+        self.cluster_nodes[cluster] = nodes
+        bounds, costs = self.bounds(cluster), self.graph.costs
+        for node in nodes:
+            self.intra[node] = {}
+        # Соседство ячеек симметрично, а платим за ячейку, в которую входим, поэтому обратный путь между входами
+        # стоит столько же с поправкой на стоимости концов: поиск от каждого входа нужен только до последующих.
+        remaining = sorted(nodes)
+        while len(remaining) > 1:
+            node = remaining.pop()
+            distances, _ = self._local_search(node, bounds, targets=set(remaining))
+            for other in remaining:
+                if other in distances:
+                    self.intra[node][other] = distances[other]
+                    self.intra[other][node] = distances[other] + costs[node] - costs[other]
+
+    # Поиск внутри прямоугольника "bounds" от ячейки "source" или от нескольких ячеек сразу (словарь
+    # {ячейка: начальная стоимость}). При "reverse" считаются стоимости путей до "source", а не от него.
+    # Если задана цель "goal", выполняется A* с оценкой Чебышёва и поиск завершается при ее достижении; если заданы
+    # "targets" - Дейкстра, завершающаяся, когда найдены стоимости до всех этих ячеек.
+    def _local_search(self, source: int | Dict[int, float], bounds: Tuple[int, int, int, int], goal: int = None,
+                      reverse: bool = False, targets: Set[int] = None) -> Tuple[Dict[int, float], Dict[int, int]]:
+        graph = self.graph
+        costs, cols = graph.costs, graph.cols
+        r0, c0, r1, c1 = bounds
+        distances = dict(source) if isinstance(source, dict) else {source: 0}
+        came_from = {}
+        open_set = [(distance, distance, index) for index, distance in distances.items()]
+        heapq.heapify(open_set)
+        weight = graph.min_cost if goal is not None else 0
+        goal_row, goal_col = divmod(goal if goal is not None else 0, cols)
+        remaining = set(targets) if targets is not None else None
+        while open_set:
+            _, distance, index = heapq.heappop(open_set)
+            if index == goal:
+                break
+            if distance > distances[index]:
+                continue
+            if remaining is not None:
+                remaining.discard(index)
+                if not remaining:  # Стоимости до всех нужных ячеек окончательны.
+                    break
+            self.expanded += 1
+            step = costs[index] if reverse else 0  # При обратном поиске платим за ячейку, из которой выходим.
+            for neighbor, value in graph.neighbours(index):
+                if not (r0 <= neighbor // cols < r1 and c0 <= neighbor % cols < c1):
+                    continue
+                cost = distance + (step if reverse else value)
+                if cost < distances.get(neighbor, math.inf):
+                    distances[neighbor], came_from[neighbor] = cost, index
+                    row, col = divmod(neighbor, cols)
+                    heapq.heappush(open_set, (cost + max(abs(row - goal_row), abs(col - goal_col)) * weight, cost,
+                                              neighbor))
+        return distances, came_from
+
+    # Детальный путь внутри прямоугольника "bounds" (без стартовой ячейки).
+    def _refine(self, start: int, goal: int, bounds: Tuple[int, int, int, int]) -> List[int]:
+        _, came_from = self._local_search(start, bounds, goal)
+        path = []
+        while goal != start:
+            path.append(goal)
+            goal = came_from[goal]
+        path.reverse()
+        return path
+
+    # Поиск пути по абстрактному графу с последующим уточнением. Возвращает путь и его стоимость.
+    def find_path(self, start: Tuple[int, int], goal: Tuple[int, int]) -> Tuple[List[Tuple[int, int]], float]:
+        graph = self.graph
+        start_index, goal_index = graph.index(*start), graph.index(*goal)
+        if not graph.costs[goal_index]:  # Конечная ячейка не может быть равной нулю.
+            raise TypeError
+        self.expanded = 0
+        goal_cluster = self.cluster_of(goal_index)
+        goal_bounds = self.bounds(goal_cluster)
+
+        # Временно подключаем старт и цель к входам своих кластеров. Из запретной стартовой ячейки можно только
+        # выйти, поэтому в этом случае подключаем ее проходимых соседей.
+        to_goal, _ = self._local_search(goal_index, goal_bounds, reverse=True,
+                                        targets=self.cluster_nodes[goal_cluster])
+        goal_edges = {node: to_goal[node] for node in self.cluster_nodes[goal_cluster] if node in to_goal}
+        entries = [(start_index, 0)] if graph.costs[start_index] else list(graph.neighbours(start_index))
+        sources: Dict[int, Dict[int, float]] = {}  # Ячейки выхода из старта, сгруппированные по кластерам.
+        for entry, offset in entries:
+            sources.setdefault(self.cluster_of(entry), {})[entry] = offset
+        start_edges, entry_of = {}, {}  # Стоимости от старта до входов и ячейки, через которые они достигнуты.
+        best_cost, best_entry = math.inf, None  # Лучший прямой путь внутри кластера цели.
+        for cluster, offsets in sources.items():  # Один поиск на кластер от всех его ячеек выхода.
+            targets = self.cluster_nodes[cluster] | ({goal_index} if cluster == goal_cluster else set())
+            from_entry, entry_came_from = self._local_search(offsets, self.bounds(cluster), targets=targets)
+            for node in targets:
+                if from_entry.get(node, math.inf) == math.inf:
+                    continue
+                entry = node
+                while entry in entry_came_from:  # Ячейка выхода, с которой начинается путь до "node".
+                    entry = entry_came_from[entry]
+                if node == goal_index and from_entry[node] < best_cost:
+                    best_cost, best_entry = from_entry[node], entry
+                if node in self.cluster_nodes[cluster] and from_entry[node] < start_edges.get(node, math.inf):
+                    start_edges[node], entry_of[node] = from_entry[node], entry
+
+        # A* по абстрактному графу.
+        weight, goal_row_col = graph.min_cost, graph.indexes(goal_index)
+        position = {self.START: start_index, self.GOAL: goal_index}
+        g_score, came_from = {self.START: 0}, {}
+        open_set = [(0, 0, self.START)]
+        while open_set:
+            _, current_g, node = heapq.heappop(open_set)
+            if node == self.GOAL or current_g >= best_cost:
+                break
+            if current_g > g_score[node]:
+                continue
+            self.expanded += 1
+            if node == self.START:
+                edges = start_edges.items()
+            else:
+                edges = [*self.intra[node].items(), *((other, graph.costs[other]) for other in self.links[node])]
+                if node in goal_edges:
+                    edges.append((self.GOAL, goal_edges[node]))
+            for other, cost in edges:
+                cost += current_g
+                if cost < g_score.get(other, math.inf):
+                    g_score[other], came_from[other] = cost, node
+                    heuristic = PathPlanner.heuristic(graph.indexes(position.get(other, other)), goal_row_col)
+                    heapq.heappush(open_set, (cost + heuristic * weight, cost, other))
+
+        if g_score.get(self.GOAL, math.inf) < best_cost:  # Путь через абстрактный граф.
+            best_cost = g_score[self.GOAL]
+            nodes = [self.GOAL]
+            while nodes[-1] != self.START:
+                nodes.append(came_from[nodes[-1]])
+            nodes.reverse()
+            path = [start_index]
+            for first, second in zip(nodes, nodes[1:]):
+                second = position.get(second, second)
+                if first == self.START:  # Участок от старта до первого входа.
+                    first = entry_of[second]
+                    if first != start_index:
+                        path.append(first)
+                cluster = self.cluster_of(first)
+                if cluster != self.cluster_of(second):  # Переход через границу кластеров.
+                    path.append(second)
+                else:
+                    path.extend(self._refine(first, second, self.bounds(cluster)))
+        elif best_cost < math.inf:  # Прямой путь внутри кластера цели лучше.
+            path = [start_index] if best_entry == start_index else [start_index, best_entry]
+            path.extend(self._refine(best_entry, goal_index, goal_bounds))
+        else:
+            raise RouteError
+        return [graph.indexes(index) for index in path], graph.costs[start_index] + best_cost
+
+    # Относительное отклонение стоимости иерархического пути от оптимальной (0 - путь оптимален).
+    def optimality_gap(self, start: Tuple[int, int], goal: Tuple[int, int]) -> float:
+        _, cost = self.find_path(start, goal)
+        _, exact = PathPlanner(self.graph).find_path(start, goal)
+        return (cost - exact) / exact
+
+    # Изменение стоимости ячейки с локальным перерасчетом: пересчитываются входы на границах ее кластера и
+    # переходы внутри него и соседних кластеров.
+    def update_cell(self, row: int, col: int, new_value: int | float) -> None:
+        self.graph.set_value(row, col, new_value)
+        cluster = self.cluster_of(self.graph.index(row, col))
+        affected = {cluster}
+        for border in self._borders(cluster):
+            self._build_border(border)
+            affected.update(border)
+        for other in affected:
+            self._build_cluster(other)
+
+
+# Планировщик в процессе-обработчике пула. Создается один раз при запуске процесса.
+_worker_planner: PathPlanner | None = None
+_worker_memory: shared_memory.SharedMemory | None = None
+
+
+# Подключение процесса-обработчика к сетке: к разделяемой памяти по имени или к файлу сетки, без передачи матрицы.
+def _attach_grid(name: str | None, path: str | None, rows: int, cols: int, min_cost: float) -> None:
+    global _worker_planner, _worker_memory
+    if path is not None:
+        grid = GridGraph.load(path)
+    else:
+        _worker_memory = shared_memory.SharedMemory(name=name)
+        grid = GridGraph.from_costs(_worker_memory.buf.cast('d'), rows, cols)
+    grid._min_cost = min_cost
+    _worker_planner = PathPlanner(grid)
 
 
-s = [[1, 0, 3, 4, 5, 0, 1, 9], [1, 0, 1, 0, 1, 0, 0, 1], [5, 0, 2, 0, 9, 0, 1, 5], [7, 0, 2, 0, 2, 0, 5, 1],
-     [9, 0, 2, 0, 1, 0, 1, 5],
-     [7, 0, 1, 0, 1, 0, 0, 4], [5, 0, 1, 0, 1, 0, 1, 3], [1, 3, 0, 0, 1, 1, 0, 1]]
+# Обработка пакета запросов в процессе-обработчике. Каждый запрос сопровождается своим номером во входном списке.
+def _solve_chunk(chunk: List[Tuple[int, Tuple[int, int], Tuple[int, int]]]
+                 ) -> List[Tuple[int, List[Tuple[int, int]], float]]:
+    paths = _worker_planner.find_paths([(start, goal) for _, start, goal in chunk])
+    return [(number, path, cost) for (number, _, _), (path, cost) in zip(chunk, paths)]
+
+
+# Параллельный поиск путей для множества пар (старт, цель) по одной карте. Стоимости ячеек один раз копируются в
+# разделяемую память (сетка из файла открывается обработчиками напрямую), и процессы пула подключаются к ней при
+# запуске, поэтому с задачами передаются только пары индексов. Пул и память живут до выхода из блока "with".
+class ParallelPlanner:
+
+    def __init__(self, matr: List[List[int]] | GridGraph, workers: int = None) -> None:
+        graph = matr if isinstance(matr, GridGraph) else GridGraph(matr)
+        self.workers: int = workers or os.cpu_count() or 1
+        self.memory: shared_memory.SharedMemory | None = None
+        path = getattr(graph.costs, 'path', None)
+        if path is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=max(graph.size, 1) * 8)
+            buffer = self.memory.buf.cast('d')
+            buffer[:graph.size] = graph.costs if isinstance(graph.costs, array) and graph.costs.typecode == 'd' \
+                else array('d', graph.costs)
+            buffer.release()
+        self.pool = ProcessPoolExecutor(self.workers, initializer=_attach_grid,
+                                        initargs=(self.memory and self.memory.name, path, graph.rows, graph.cols,
+                                                  graph.min_cost))
+
+    def __enter__(self) -> 'ParallelPlanner':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.pool.shutdown()
+        if self.memory is not None:
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+
+    # Разбиение запросов на пакеты: несколько пакетов на процесс, чтобы нагрузка выравнивалась.
+    def _submit(self, pairs: Sequence[Tuple[Tuple[int, int], Tuple[int, int]]], chunk_size: int = None) -> List:
+        numbered = [(number, start, goal) for number, (start, goal) in enumerate(pairs)]
+        chunk_size = chunk_size or max(1, len(numbered) // (self.workers * 4))
+        return [self.pool.submit(_solve_chunk, numbered[i:i + chunk_size])
+                for i in range(0, len(numbered), chunk_size)]
+
+    # Пути и стоимости в порядке входных пар. Для несвязанных пар - пустой путь и бесконечная стоимость.
+    def find_paths(self, pairs: Sequence[Tuple[Tuple[int, int], Tuple[int, int]]], chunk_size: int = None
+                   ) -> List[Tuple[List[Tuple[int, int]], float]]:
+        result: List[Tuple[List[Tuple[int, int]], float]] = [([], math.inf)] * len(pairs)
+        for future in self._submit(pairs, chunk_size):
+            for number, path, cost in future.result():
+                result[number] = path, cost
+        return result
+
+    # Результаты по мере готовности в виде (номер пары во входном списке, путь, стоимость).
+    def as_completed(self, pairs: Sequence[Tuple[Tuple[int, int], Tuple[int, int]]], chunk_size: int = None
+                     ) -> Iterator[Tuple[int, List[Tuple[int, int]], float]]:
+        for future in as_completed(self._submit(pairs, chunk_size)):
+            yield from future.result()
+
+
+if __name__ == '__main__':
+    s = [[1, 0, 3, 4, 5, 0, 1, 9], [1, 0, 1, 0, 1, 0, 0, 1], [5, 0, 2, 0, 9, 0, 1, 5], [7, 0, 2, 0, 2, 0, 5, 1],
+         [9, 0, 2, 0, 1, 0, 1, 5],
+         [7, 0, 1, 0, 1, 0, 0, 4], [5, 0, 1, 0, 1, 0, 1, 3], [1, 3, 0, 0, 1, 1, 0, 1]]
+
+    # s = [[1, 1, 3, 4, 5, 1, 1, 0], [0, 0, 0, 0, 0, 0, 0, 1], [0, 1, 2, 1, 9, 0, 0, 5], [0, 1, 0, 0, 0, 2, 0, 1],
+    #      [0, 1, 0, 2, 0, 3, 0, 5],
+    #      [0, 1, 0, 0, 1, 0, 0, 4], [0, 1, 0, 0, 0, 0, 0, 3], [0, 0, 1, 1, 1, 1, 1, 0]]
+
+    k = ASearch(s, (0, 0), (0, 6))
+    k()
+
+    # Многократные запросы по одной построенной сетке.
+    planner = PathPlanner(s)
+    for path, cost in planner.find_paths([((0, 0), (0, 6)), ((0, 0), (7, 7)), ((7, 0), (0, 7))]):
+        print(path, cost)
+
+    # Перепланирование при изменении ячеек.
+    incremental = IncrementalPlanner(s, (7, 0), (0, 7))
+    print(incremental.find_path())
+    incremental.update_cell(4, 4, 9)
+    print(incremental.find_path(), incremental.expanded)
+
+    # Иерархический поиск на большой карте: число раскрытых узлов и отклонение от оптимума.
+    field = [[random.choice((0, 1, 1, 1, 2, 3)) for _ in range(200)] for _ in range(200)]
+    field[0][0] = field[199][199] = 1
+    hierarchy = HierarchicalPlanner(field, cluster_size=20)
+    exact_planner = PathPlanner(hierarchy.graph)
+    try:
+        exact_planner.find_path((0, 0), (199, 199))
+        print(f"A*: {exact_planner.expanded} узлов, HPA*: ", end="")
+        gap = hierarchy.optimality_gap((0, 0), (199, 199))
+        print(f"{hierarchy.expanded} узлов, отклонение {gap:.2%}")
+    except RouteError as e:
+        print(e.message)
+
+    # Эвристика ALT против оценки Чебышёва: число раскрытых узлов.
+    weighted = [[random.choice((0, 1, 3, 5, 9, 9)) for _ in range(150)] for _ in range(150)]
+    weighted[0][0] = weighted[149][149] = 1
+    landmarks = Landmarks(weighted, count=8)
+    try:
+        plain, alt = PathPlanner(landmarks.graph), PathPlanner(landmarks.graph, landmarks)
+        plain_cost, alt_cost = plain.find_path((0, 0), (149, 149))[1], alt.find_path((0, 0), (149, 149))[1]
+        print(f"Чебышёв: {plain.expanded} узлов, ALT: {alt.expanded} узлов, стоимости {plain_cost:g} и {alt_cost:g}")
+    except RouteError as e:
+        print(e.message)
+
+    # Режимы поиска на открытой карте с одинаковой стоимостью ячеек: раскрытые узлы и время.
+    open_field = [[0 if random.random() < 0.1 else 1 for _ in range(200)] for _ in range(200)]
+    open_field[0][0] = open_field[199][199] = 1
+    mode_planner = PathPlanner(open_field)
+    for mode in ('astar', 'bidirectional', 'jps'):
+        t1 = time.perf_counter()
+        try:
+            _, cost = mode_planner.find_path((0, 0), (199, 199), mode)
+            print(f"{mode}: стоимость {cost:g}, {mode_planner.expanded} узлов, {time.perf_counter() - t1:.3f} с")
+        except RouteError as e:
+            print(e.message)
 
-# s = [[1, 1, 3, 4, 5, 1, 1, 0], [0, 0, 0, 0, 0, 0, 0, 1], [0, 1, 2, 1, 9, 0, 0, 5], [0, 1, 0, 0, 0, 2, 0, 1],
-#      [0, 1, 0, 2, 0, 3, 0, 5],
-#      [0, 1, 0, 0, 1, 0, 0, 4], [0, 1, 0, 0, 0, 0, 0, 3], [0, 0, 1, 1, 1, 1, 1, 0]]
+    # Параллельный поиск множества путей.
+    queries = [((random.randrange(200), random.randrange(200)), (random.randrange(200), random.randrange(200)))
+               for _ in range(64)]
+    t1 = time.perf_counter()
+    serial = PathPlanner(hierarchy.graph).find_paths(queries)
+    t2 = time.perf_counter()
+    with ParallelPlanner(hierarchy.graph) as parallel:
+        assert [cost for _, cost in parallel.find_paths(queries)] == [cost for _, cost in serial]
+    t3 = time.perf_counter()
+    print(f"Последовательно: {t2 - t1:.3f} с, параллельно: {t3 - t2:.3f} с")
 
+    # Сетка из файла, отображенного в память.
+    hierarchy.graph.save('grid.bin')
+    mapped = GridGraph.load('grid.bin')
+    print(f"Из файла: {PathPlanner(mapped).find_path((0, 0), (199, 199))[1]:g}")
+    mapped.costs.close()
+    os.remove('grid.bin')
 
-k = ASearch(s, (0, 0), (0, 6))
-k()
+    # Сравнение времени построения объектного графа "Graph" и компактной сетки "GridGraph".
+    big = [[random.randint(0, 9) for _ in range(500)] for _ in range(500)]
+    t1 = time.perf_counter()
+    Graph(big)
+    t2 = time.perf_counter()
+    GridGraph(big)
+    t3 = time.perf_counter()
+    print(f"Graph: {t2 - t1:.3f} с, GridGraph: {t3 - t2:.3f} с")
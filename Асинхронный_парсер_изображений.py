@@ -1,102 +1,289 @@
 from aiohttp_retry import RetryClient, ExponentialRetry
-from typing import List, Any, Callable
+from typing import List, Any, Callable, Iterable, Awaitable, Optional, Tuple
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from html.parser import HTMLParser
 from bs4 import BeautifulSoup
-import time, requests
+import time
 import asyncio
 import aiofiles
 import aiohttp
-import copy
 import os
 
 
+# Быстрое извлечение атрибутов без построения дерева документа: потоковый разбор HTML, собираются значения атрибута
+# "attribute" тегов "tag" внутри первого блока div.item_card (как "soup.find('div', class_='item_card').find_all()").
+class ItemCardExtractor(HTMLParser):
+
+    def __init__(self, tag: str, attribute: str) -> None:
+        super().__init__()
+        self.tag = tag
+        self.attribute = attribute
+        self.depth = 0  # Глубина вложенности div внутри блока item_card (0 - вне блока).
+        self.done = False  # Блок item_card уже пройден.
+        self.values = []
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if self.done:
+            return
+        if self.depth:
+            if tag == 'div':
+                self.depth += 1
+            elif tag == self.tag:
+                self.values.extend(value for name, value in attrs if name == self.attribute and value is not None)
+        elif tag == 'div' and 'item_card' in (dict(attrs).get('class') or '').split():
+            self.depth = 1
+
+    def handle_endtag(self, tag: str) -> None:
+        if self.depth and tag == 'div':
+            self.depth -= 1
+            self.done = not self.depth
+
+
+# Функция для пула разбора (на уровне модуля, чтобы ее можно было передать в процесс).
+def extract_item_card(html: str, tag: str, attribute: str) -> List[str]:
+    extractor = ItemCardExtractor(tag, attribute)
+    extractor.feed(html)
+    extractor.close()
+    return extractor.values
+
+
+# Адаптивное ограничение параллельности по схеме AIMD: пока ответы приходят без ошибок и задержка близка к
+# наименьшей замеченной, допустимое количество одновременных запросов растет примерно на единицу за "окно"
+# запросов; ответы 429/5xx, ошибки соединения и таймауты, а также рост задержки уменьшают его вдвое (не чаще
+# одного раза за время ответа, чтобы волна одновременных ошибок не обнулила параллельность).
+class AdaptiveLimiter:
+
+    def __init__(self, initial: int = 10, minimum: int = 1, maximum: int = 200, decrease: float = 0.5,
+                 latency_factor: float = 3.0) -> None:
+        self.limit = float(initial)  # Текущее допустимое количество одновременных запросов.
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease  # Множитель уменьшения при перегрузке.
+        self.latency_factor = latency_factor  # Во сколько раз задержка может превышать наименьшую.
+        self.active = 0  # Выполняющиеся запросы.
+        self.latency: Optional[float] = None  # Сглаженная задержка ответа.
+        self.baseline: Optional[float] = None  # Наименьшая замеченная задержка.
+        self.last_decrease = 0.0
+        self.started = time.monotonic()
+        self.history = [(0.0, initial)]  # Изменения параллельности: (секунды от начала, значение).
+        self.condition: Optional[asyncio.Condition] = None  # Создается в работающем цикле событий.
+
+    async def __aenter__(self) -> None:
+        if self.condition is None:
+            self.condition = asyncio.Condition()
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.active < int(self.limit))
+            self.active += 1
+
+    async def __aexit__(self, *args) -> None:
+        async with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+    # Учет результата запроса: успех с задержкой "latency" или признак перегрузки.
+    async def record(self, ok: bool, latency: float = None) -> None:
+        now, before = time.monotonic(), int(self.limit)
+        if ok and latency is not None:
+            self.baseline = latency if self.baseline is None else min(self.baseline, latency)
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            ok = self.latency <= self.baseline * self.latency_factor
+            if ok:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        if not ok and now - self.last_decrease >= (self.latency or 0.1):
+            self.limit = max(self.minimum, self.limit * self.decrease)
+            self.last_decrease = now
+        if int(self.limit) != before:
+            self.history.append((now - self.started, int(self.limit)))
+            if self.condition is not None:
+                async with self.condition:
+                    self.condition.notify_all()
+
+    # Наблюдение за каждой попыткой запроса (включая повторы) через трассировку сессии aiohttp.
+    def trace_config(self) -> aiohttp.TraceConfig:
+        async def on_request_start(session, context, params) -> None:
+            context.start = time.monotonic()
+
+        async def on_request_end(session, context, params) -> None:
+            status = params.response.status
+            await self.record(status != 429 and status < 500, time.monotonic() - context.start)
+
+        async def on_request_exception(session, context, params) -> None:
+            await self.record(False)
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_exception.append(on_request_exception)
+        return trace_config
+
+    # Отчет об изменении параллельности: значение на конец каждой секунды работы.
+    def report(self) -> str:
+        samples, i = [], 0
+        for second in range(int(time.monotonic() - self.started) + 1):
+            while i + 1 < len(self.history) and self.history[i + 1][0] <= second + 1:
+                i += 1
+            samples.append(f'{second + 1}с: {self.history[i][1]}')
+        return 'Параллельность запросов: ' + ', '.join(samples)
+
+
 class ImgParser:
 
-    def __init__(self, start_page, save_directory):
+    def __init__(self, start_page, save_directory, workers: Tuple[int, int, int] = (10, 20, 100),
+                 queue_size: int = 1000, parse_executor: str = 'thread', parse_workers: int = None,
+                 limiter: 'AdaptiveLimiter' = None, limit: int = 200, limit_per_host: int = 100):
         self.start_page = start_page  # Адрес стартовой страницы с линками первого уровня.
         self.path = save_directory  # Путь к директории, куда будем сохраняять изображения.
-        self.links_2 = []  # Список, куда будем помещать распарсенные линки второго уровня.
+        self.workers = workers  # Количество обработчиков этапов: страницы первого уровня, второго уровня, загрузка.
+        self.queue_size = queue_size  # Размер очередей между этапами. Заполненная очередь приостанавливает
+        # предыдущий этап, поэтому в памяти одновременно находится ограниченное количество линков.
+        self.parse_executor_type = parse_executor  # Пул для разбора HTML: 'thread' или 'process'.
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        self.parse_executor: Optional[Executor] = None  # Создается на время работы "main".
+        self.loop_lag = []  # Задержки цикла событий (секунды), измеренные во время работы.
+        self.limiter = limiter or AdaptiveLimiter()  # Адаптивное ограничение количества одновременных запросов.
+        self.limit = limit  # Ограничения соединений: всего и к одному хосту.
+        self.limit_per_host = limit_per_host
         self.links_images = set()  # В данное можество будут помещаться  распарсенные линки изображений.
-        self.tasks = []  # Список, куда будут помещаться сформированные задачи.
         self.total = 0  # Счетчик количества сохраненных изображений.
         self.error = []  # При скачивании изображений могут возникать ошибки. В данный список будет помещать
         # линки на изображения, скачивание которых завершилось ошибкой.
 
+    async def fetch_page(self, link: str, client: RetryClient) -> Optional[str]:  # Загрузка HTML страницы.
+        async with self.limiter:
+            async with client.get(link) as response:
+                if response.ok:
+                    return await response.text()
+
     async def make_soup(self, link: str,
-                        session: aiohttp.ClientSession) -> BeautifulSoup:  # Метод, создающий "суп" из данных HTML страницы.
-        retry_options = ExponentialRetry(attempts=10)  # Количество повторных попыток подключений при
-        # возникновении ошибок.
-        retry_client = RetryClient(retry_options=retry_options, client_session=session, start_timeout=0.5)  # Создаем
-        # объект для переподключений данной клиентской сессии.
-        async with retry_client.get(link) as response:
-            if response.ok:
-                return BeautifulSoup(await response.text(), 'lxml')
-
-    def first_nested_links(self) -> List[str]:  # Метод, возвращающий список из линков первой вложенности.
-        resp = requests.get(self.start_page + 'index.html')
-        soup = BeautifulSoup(resp.text, 'lxml')
-        self.links_1 = [self.start_page + i['href']
-                        for i in soup.find('div', class_='item_card').find_all('a')]
-        return self.links_1
-
-    async def second_nested_links(self, link: str, session: aiohttp.ClientSession,
-                                  semaphore: asyncio.Semaphore):  # Метод, возвращающий список из линков второй вложенности.
-        async with semaphore:  # Семафор, ограничиващий количество одновременных подключений для предотвращения перегрузки сервера.
-            soup = await self.make_soup(link, session)
-            self.links_2.extend([self.start_page + '/depth2/' + i['href']
-                                 for i in soup.find('div', class_='item_card').find_all('a')])
-
-    async def link_image(self, link: str, session: aiohttp.ClientSession,
-                         semaphore: asyncio.Semaphore) -> None:  # Метод, возвращающий список с линками изображений.
-        async with semaphore:
-            soup = await self.make_soup(link, session)
-            self.links_images.update([i['src'] for i in soup.find('div', class_='item_card').find_all('img')])
-
-    def make_task(self, func: Callable, links: List[str], session: aiohttp.ClientSession,
-                  semaphore: asyncio.Semaphore) -> List[Any]:  # Метод, формирующий задачи.
-        if self.tasks:
-            self.tasks.clear()  # Так как метод будет вызван неоднократно, перед его использованием очищаем список с задачами, если он не пуст.
-        for link in links:
-            self.tasks.append(func(link, session, semaphore))
-        return self.tasks
+                        client: RetryClient) -> BeautifulSoup:  # Метод, создающий "суп" из данных HTML страницы.
+        # Разбор выполняется в пуле, чтобы не останавливать цикл событий.
+        html = await self.fetch_page(link, client)
+        if html is not None:
+            return await asyncio.get_running_loop().run_in_executor(self.parse_executor, BeautifulSoup, html, 'lxml')
+
+    async def extract_links(self, link: str, client: RetryClient, tag: str,
+                            attribute: str) -> List[str]:  # Атрибуты тегов блока item_card, быстрым разбором в пуле.
+        html = await self.fetch_page(link, client)
+        if html is None:
+            return []
+        return await asyncio.get_running_loop().run_in_executor(self.parse_executor, extract_item_card, html, tag,
+                                                                attribute)
+
+    async def first_nested_links(self, client: RetryClient) -> List[str]:  # Метод, возвращающий список
+        # из линков первой вложенности.
+        return [self.start_page + href
+                for href in await self.extract_links(self.start_page + 'index.html', client, 'a', 'href')]
+
+    async def second_nested_links(self, link: str, client: RetryClient) -> List[str]:  # Метод,
+        # возвращающий список из линков второй вложенности.
+        return [self.start_page + '/depth2/' + href for href in await self.extract_links(link, client, 'a', 'href')]
 
-    async def write_file(self, link: str, session: aiohttp.ClientSession,
-                         semaphore: asyncio.Semaphore) -> None:  # Сохранение изображений.
+    async def link_image(self, link: str, client: RetryClient) -> List[str]:  # Метод, возвращающий
+        # список с новыми (ранее не встречавшимися) линками изображений.
+        links = set(await self.extract_links(link, client, 'img', 'src')) - self.links_images
+        self.links_images.update(links)
+        return list(links)
+
+    async def write_file(self, link: str, client: RetryClient) -> None:  # Сохранение изображений.
         name_img = link.split('/')[-1]  # Вычленяем из имени файла уникальный номер.
-        retry_options = ExponentialRetry(attempts=10)  # Количество повторных попыток подключений при
-        # возникновении ошибок.
-        retry_client = RetryClient(retry_options=retry_options, client_session=session, start_timeout=0.5)  # Создаем
-        # объект для переподключений данной клиентской сессии.
-        async with semaphore:  # Семафор, ограничиващий количество одновременных подключений для предотвращения
-            # перегрузки сервера.
-            async with aiofiles.open(f'{self.path}{name_img}', mode='wb') as f:
-                async with retry_client.get(link) as response:
-                    if response.ok:
-                        try:
-                            async for x in response.content.iter_chunked(
-                                    2048):  # Разбиваем файл на чанки, скачиваем его частями.
-                                await f.write(x)
-                            self.total += 1
-                            print(f'Изображение сохранено {name_img}', self.total)
-                        except asyncio.exceptions.TimeoutError:
-                            self.error.append(link)
-                            print(f'Превышен таймаут при загрузке файла {name_img}')
-                        except Exception as e:
-                            self.error.append(link)
-                            print(f'Ошибка сохранения файла {name_img}')
+        async with self.limiter, aiofiles.open(f'{self.path}{name_img}', mode='wb') as f:
+            async with client.get(link) as response:
+                if response.ok:
+                    try:
+                        async for x in response.content.iter_chunked(
+                                2048):  # Разбиваем файл на чанки, скачиваем его частями.
+                            await f.write(x)
+                        self.total += 1
+                        print(f'Изображение сохранено {name_img}', self.total)
+                    except asyncio.exceptions.TimeoutError:
+                        await self.limiter.record(False)  # Таймаут чтения - признак перегрузки сервера.
+                        self.error.append(link)
+                        print(f'Превышен таймаут при загрузке файла {name_img}')
+                    except Exception as e:
+                        self.error.append(link)
+                        print(f'Ошибка сохранения файла {name_img}')
+
+    # Подача линков в очередь первого этапа. После линков в очередь помещается по одному признаку завершения (None)
+    # на каждый обработчик этапа.
+    @staticmethod
+    async def feed(links: Iterable[str], target: asyncio.Queue, workers: int) -> None:
+        for link in links:
+            await target.put(link)
+        for _ in range(workers):
+            await target.put(None)
+
+    # Этап конвейера: "workers" обработчиков берут линки из очереди "source" и передают результаты в очередь
+    # "target". Каждый обработчик завершается, получив None. Когда завершились все обработчики этапа, признаки
+    # завершения передаются обработчикам следующего этапа ("next_workers").
+    @staticmethod
+    async def stage(handler: Callable[[str], Awaitable[Optional[List[str]]]], source: asyncio.Queue,
+                    target: Optional[asyncio.Queue], workers: int, next_workers: int = 0) -> None:
+        async def worker() -> None:
+            while (link := await source.get()) is not None:
+                try:
+                    for item in await handler(link) or ():
+                        await target.put(item)  # Ждет, пока следующий этап не освободит место в очереди.
+                except Exception as e:  # Ошибка одной страницы не должна останавливать конвейер.
+                    print(f'Ошибка обработки страницы {link}: {e!r}')
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        for _ in range(next_workers):
+            await target.put(None)
+
+    # Измерение задержки цикла событий: насколько позже запланированного просыпается корутина. Большие значения
+    # означают, что цикл событий занят вычислениями вместо ввода-вывода.
+    async def monitor_loop_lag(self, interval: float = 0.1) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            planned = loop.time() + interval
+            await asyncio.sleep(interval)
+            self.loop_lag.append(max(0.0, loop.time() - planned))
 
     async def main(self) -> None:  # Метод, запускающий цикл событий.
-        semaphore = asyncio.Semaphore(
-            100)  # Одновременно в любой момент времени может быть активным не более 100 корутин.
-        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=True)) as session:
+        # Разбор HTML выполняется в отдельном пуле, цикл событий занят только вводом-выводом; его задержка
+        # измеряется все время работы и выводится по завершении.
+        pages_1, pages_2, images = self.workers
+        self.parse_executor = (ProcessPoolExecutor if self.parse_executor_type == 'process'
+                               else ThreadPoolExecutor)(self.parse_workers)
+        monitor = asyncio.create_task(self.monitor_loop_lag())
+        try:
+            await self.crawl(pages_1, pages_2, images)
+        finally:
+            monitor.cancel()
+            self.parse_executor.shutdown()
+            self.parse_executor = None
+        if self.loop_lag:
+            print(f'Задержка цикла событий: средняя {sum(self.loop_lag) / len(self.loop_lag) * 1000:.1f} мс, '
+                  f'наибольшая {max(self.loop_lag) * 1000:.1f} мс')
+        print(self.limiter.report())
+
+    async def crawl(self, pages_1: int, pages_2: int, images: int) -> None:  # Работа конвейера.
+        # Конвейер из трех этапов, связанных ограниченными очередями: страницы первого уровня -> страницы второго
+        # уровня -> линки изображений -> загрузка. Все этапы работают одновременно, поэтому изображения начинают
+        # сохраняться сразу после разбора первых страниц.
+        # Один клиент с повторами на весь обход. Соединения переиспользуются (keep-alive), адреса хостов кэшируются,
+        # ответы 429/5xx повторяются с экспоненциальной задержкой и вместе с ошибками соединения уменьшают
+        # допустимую параллельность (см. "AdaptiveLimiter.trace_config").
+        connector = aiohttp.TCPConnector(ssl=True, limit=self.limit, limit_per_host=self.limit_per_host,
+                                         keepalive_timeout=30, ttl_dns_cache=300)
+        async with aiohttp.ClientSession(connector=connector,
+                                         trace_configs=[self.limiter.trace_config()]) as session:
+            retry_options = ExponentialRetry(attempts=10, start_timeout=0.5,
+                                             statuses={429, 500, 502, 503, 504})  # Количество повторных попыток
+            # подключений при возникновении ошибок.
+            client = RetryClient(client_session=session, retry_options=retry_options)
+            queues = [asyncio.Queue(self.queue_size) for _ in range(3)]
             await asyncio.gather(
-                *self.make_task(self.second_nested_links, self.first_nested_links(), session, semaphore))
-            await asyncio.gather(*self.make_task(self.link_image, self.links_2, session, semaphore))
-            await asyncio.gather(*self.make_task(self.write_file, self.links_images, session, semaphore))
+                self.feed(await self.first_nested_links(client), queues[0], pages_1),
+                self.stage(lambda link: self.second_nested_links(link, client), queues[0], queues[1],
+                           pages_1, pages_2),
+                self.stage(lambda link: self.link_image(link, client), queues[1], queues[2], pages_2, images),
+                self.stage(lambda link: self.write_file(link, client), queues[2], None, images))
             while self.error:  # Попытки дозаписать "упавшие файлы", их линки при сутствуют в списке.
-                list_error = copy.deepcopy(
-                    self.error)  # Делаем губокую копию списка с линками, т.к он будет полностью перезаписан далее.
-                self.error.clear()  # Очищаем список с линками.
-                await asyncio.gather(*self.make_task(self.write_file, list_error, session, semaphore))
+                list_error, self.error = self.error, []  # Список будет заполнен заново упавшими при повторе.
+                queue = asyncio.Queue(self.queue_size)
+                await asyncio.gather(self.feed(list_error, queue, images),
+                                     self.stage(lambda link: self.write_file(link, client), queue, None, images))
 
 
 if __name__ == '__main__':
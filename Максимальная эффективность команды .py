@@ -12,16 +12,23 @@
 
 # ================================================
 
-from typing import List, Tuple, Dict, Optional, Iterator, Union
+from typing import List, Tuple, Dict, Optional, Iterator, Union, Sequence
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+import heapq
+import os
+import random
 import time
-import copy
+import math
 import pprint
+import itertools
 
 # ================================================
 
 # Класс Юнит.
 
 class Unit:
+    __slots__ = ('skill_dev', 'skill_mgmt', 'num')  # Без словаря атрибутов: меньше памяти на участника.
 
     def __init__(self, skill_dev: str, skill_mgmt: str, num: int = None) -> None:
         self.skill_dev = int(skill_dev)  # Скилл разработки.
@@ -56,6 +63,22 @@ class Unit:
         return f"({self.num}, [{self.skill_dev}, {self.skill_mgmt}])"
 
 
+# ===============================================
+
+# Ключи Зобриста: каждому номеру участника соответствует случайное 64-битное число. Отпечаток группы - XOR ключей
+# ее участников, поэтому при перестановке двух участников он пересчитывается двумя операциями XOR.
+
+_zobrist_keys: Dict[int, int] = {}
+_zobrist_random = random.Random(0x5EED)
+
+
+def zobrist_key(num: int) -> int:
+    key = _zobrist_keys.get(num)
+    if key is None:
+        key = _zobrist_keys[num] = _zobrist_random.getrandbits(64)
+    return key
+
+
 # ===============================================
 
 # Класс формирования групп с применением сертфикатов к участникам если такие есть.
@@ -93,6 +116,38 @@ class GroupBy:
             self.group_dev.append(unit_group_dev)
             self.group_mgmt.append(unit_group_mgmt)
 
+        self.fingerprint = self.__fingerprint(self.group_dev)  # Отпечаток состава группы разработки.
+
+    # Создание групп из готовых списков участников (без разбора строк скиллов и сертификатов).
+    @classmethod
+    def from_units(cls, group_dev: List[Unit], group_mgmt: List[Unit]) -> "GroupBy":
+        groups = cls.__new__(cls)
+        groups.group_dev = list(group_dev)
+        groups.group_mgmt = list(group_mgmt)
+        groups.fingerprint = cls.__fingerprint(groups.group_dev)
+        return groups
+
+    @staticmethod
+    def __fingerprint(group: List[Unit]) -> int:
+        fingerprint = 0
+        for unit in group:
+            fingerprint ^= zobrist_key(unit.num)
+        return fingerprint
+
+    # Копия групп: списки новые, участники общие (при перестановках участники не меняются).
+    def copy(self) -> "GroupBy":
+        return GroupBy.from_units(self.group_dev, self.group_mgmt)
+
+    # Изменение общего скилла при обмене group_mgmt[k] и group_dev[j], без пересчета сумм групп.
+    def swap_delta(self, k: int, j: int) -> int:
+        to_dev, to_mgmt = self.group_mgmt[k], self.group_dev[j]
+        return (to_dev.skill_dev - to_dev.skill_mgmt) - (to_mgmt.skill_dev - to_mgmt.skill_mgmt)
+
+    # Обмен group_mgmt[k] и group_dev[j] с обновлением отпечатка.
+    def swap(self, k: int, j: int) -> None:
+        self.fingerprint ^= zobrist_key(self.group_dev[j].num) ^ zobrist_key(self.group_mgmt[k].num)
+        self.group_mgmt[k], self.group_dev[j] = self.group_dev[j], self.group_mgmt[k]
+
     # Вызов и возврат обьекта с примененными сертификатами.
     def __call__(self, certificates: Optional[List[List[int]]] = None) -> "GroupBy":
         self.app_of_certificates(certificates)
@@ -128,10 +183,7 @@ class GroupBy:
         return f"Разработка: {group_dev}\nУправление: {group_mgmt}\nОбщий скилл: {self.summ_skills()}"
 
     def __hash__(self) -> int:
-        return hash(
-            tuple(sorted([tuple(item) for item in self.group_dev])) +
-            tuple(sorted([tuple(item) for item in self.group_mgmt]))
-        )
+        return self.fingerprint
 
     #  Сравнение групп по их скиллам, упорядоченными сортировками.
     #  Группы считаются равными...................................
@@ -150,8 +202,10 @@ class GroupBy:
 # Класс пераспределения поданных групп с учетом максимального общего скилла.
 
 class GroupOptimizer:
+    SHOW_LIMIT = 10  # Сколько вариантов разбиения выводит "__str__", остальные - через "optimal_partitions".
 
-    def __init__(self, groups: GroupBy) -> None:
+    def __init__(self, groups: GroupBy, exact: bool = False) -> None:
+        self.exact = exact  # Точный расчет сортировкой вместо перестановок.
         self.tatal = 0  # Общий скилл.
         self.item_count = 0  # Счетчик итераций.
         self.groups = groups
@@ -168,11 +222,55 @@ class GroupOptimizer:
 
     # Метод просматривает список промежуточных групп, и если список не пуст, производит расчет.
     def calculate_result_benefit(self):
+        if self.exact:
+            self.calculate_exact_benefit()
+            return
         self.intermediate_groups.append(self.groups)
         while self.intermediate_groups:
             self.groups = self.intermediate_groups.pop()
             self.сalculate_intermediate_benefit()
 
+    # Точный расчет за O(n log n). Участник в разработке вместо управления дает прирост "skill_dev - skill_mgmt",
+    # поэтому общий скилл равен сумме скиллов управления всех участников плюс сумма приростов разработчиков, и он
+    # максимален, когда в разработку попадает половина участников с наибольшим приростом.
+    def calculate_exact_benefit(self) -> Tuple[int, GroupBy]:
+        units = [*self.groups.group_dev, *self.groups.group_mgmt]
+        units.sort(key=lambda unit: unit.skill_mgmt - unit.skill_dev)  # По убыванию прироста.
+        half = len(units) // 2
+        result = GroupBy.from_units(units[:half], units[half:])
+        self.total = result.summ_skills()
+        self.result_groups = {result}
+        return self.total, result
+
+    # Разбиение участников по приросту для точного режима: обязательные разработчики (прирост выше граничного),
+    # участники с граничным приростом, из которых в разработку нужно выбрать "need", и обязательные менеджеры.
+    def __split_by_gain(self) -> Tuple[List[Unit], List[Unit], int, List[Unit]]:
+        units = [*self.groups.group_dev, *self.groups.group_mgmt]
+        units.sort(key=lambda unit: unit.skill_mgmt - unit.skill_dev)
+        half = len(units) // 2
+        if not half:
+            return [], [], 0, units
+        boundary = units[half - 1].skill_dev - units[half - 1].skill_mgmt
+        first = next(i for i, unit in enumerate(units) if unit.skill_dev - unit.skill_mgmt == boundary)
+        last = next((i for i in range(half, len(units)) if units[i].skill_dev - units[i].skill_mgmt != boundary),
+                    len(units))
+        return units[:first], units[first:last], half - first, units[last:]
+
+    # Ленивый перебор всех оптимальных разбиений: оптимальны ровно те, где в разработке все участники с приростом
+    # выше граничного и любые "need" участников с граничным приростом. Параметры "start"/"stop" позволяют
+    # постранично просматривать результаты.
+    def optimal_partitions(self, start: int = 0, stop: Optional[int] = None) -> Iterator[GroupBy]:
+        devs, tied, need, mgmts = self.__split_by_gain()
+        for chosen in itertools.islice(itertools.combinations(range(len(tied)), need), start, stop):
+            chosen = set(chosen)
+            yield GroupBy.from_units(devs + [unit for i, unit in enumerate(tied) if i in chosen],
+                                     [unit for i, unit in enumerate(tied) if i not in chosen] + mgmts)
+
+    # Количество оптимальных разбиений без их построения.
+    def count_optimal(self) -> int:
+        _, tied, need, _ = self.__split_by_gain()
+        return math.comb(len(tied), need)
+
     def сalculate_intermediate_benefit(self):
         # Определяем цикл, в котором последовательно проходим по элементам первого списка,
         # каждый из таких элементов мы будем менять местами последовательно со всеми элементами второго списка и сравнивать,
@@ -183,46 +281,182 @@ class GroupOptimizer:
         # снова местами и добаляем комбинацию в список "self.viewed_groups", чтобы более к нему не возвращаться.
         # И так пока для данного элемента первого списка s1[k] не пройдемся по всем элементам второго списка.
         # Затем увеличиваем значение k на единицу и повторяем все снова.
-        k = 0
+        # После обмена просмотр продолжается с того же k, а не с начала: выгоден обмен только участника с большим
+        # приростом "skill_dev - skill_mgmt" на участника с меньшим, поэтому приросты в группе разработки только
+        # растут, и уже просмотренные s1[k] снова выгодными не станут. Достаточно одного прохода за O(n²).
         self.total = self.groups.summ_skills()
         if not self.groups in self.viewed_groups:  # Проверка, не содержится ли поданный список в просмотренных.
-            while k < len(self.groups):
+            for k in range(len(self.groups)):
                 for j in range(len(self.groups)):
-                    self.groups.group_mgmt[k], self.groups.group_dev[j] = self.groups.group_dev[j], \
-                        self.groups.group_mgmt[k]
-                    self.total1 = self.groups.summ_skills()
+                    self.total1 = self.total + self.groups.swap_delta(k, j)  # Скилл после обмена, за O(1).
                     self.item_count += 1
                     if self.total1 < self.total:
-                        self.groups.group_mgmt[k], self.groups.group_dev[j] = self.groups.group_dev[j], \
-                            self.groups.group_mgmt[k]
+                        continue
                     elif self.total1 == self.total:
-                        self.intermediate_groups.append(copy.deepcopy(self.groups))
-                        self.groups.group_mgmt[k], self.groups.group_dev[j] = self.groups.group_dev[j], \
-                            self.groups.group_mgmt[k]
-                        self.viewed_groups.add(copy.deepcopy(self.groups))
+                        self.groups.swap(k, j)
+                        self.intermediate_groups.append(self.groups.copy())
+                        self.groups.swap(k, j)
+                        self.viewed_groups.add(self.groups.copy())
                     else:
+                        self.groups.swap(k, j)
                         self.total = self.total1
-                        k = 0
-                        break
-                else:  # Если цикл for завершился штатно, без "break", то отработает данный блок.
-                    k += 1
             self.result_groups.add((self.groups))
 
+    # Вывод первых "SHOW_LIMIT" вариантов: в точном режиме оптимальных разбиений может быть астрономически много.
     def __str__(self):
         self.calculate_result_benefit()
+        results = self.optimal_partitions(0, self.SHOW_LIMIT) if self.exact else \
+            itertools.islice(self.result_groups, self.SHOW_LIMIT)
+        count = self.count_optimal() if self.exact else len(self.result_groups)
         s = '\n'
-        for item, result_group in enumerate(self.result_groups):
-            if len(self.result_groups) > 1:
+        for item, result_group in enumerate(results):
+            if count > 1:
                 s += f"Вариант №{item + 1}:\n"
             s += str(result_group) + "\n\n"
+        if count > self.SHOW_LIMIT:
+            s += f"Показаны {self.SHOW_LIMIT} из {self.__count_text(count)} вариантов.\n"
         return s
 
+    # Количество вариантов для вывода: очень большие числа - порядком величины (перевод в строку числа из сотен
+    # тысяч цифр медленный и ограничен интерпретатором).
+    @staticmethod
+    def __count_text(count: int) -> str:
+        if count.bit_length() <= 1000:
+            return str(count)
+        return f"~10^{int((count.bit_length() - 1) * math.log10(2))}"
+
+
+# ================================================
+
+# Распределение участников по k ролям (разработка, управление, тестирование, ...) с заданной вместимостью ролей и
+# наибольшим общим скиллом. Участники добавляются по одному, как строки в венгерском алгоритме: новый участник
+# занимает роль r0, участник из r0 переходит в r1 и т.д., пока цепочка не закончится в роли со свободным местом.
+# Выбирается цепочка с наибольшим итоговым приростом (кратчайший путь Беллмана-Форда по графу из k ролей), что
+# сохраняет оптимальность распределения после каждого шага. Цена перехода a -> b - наименьшая потеря скилла
+# "skill[a] - skill[b]" среди участников роли a, она берется из кучи для пары (a, b) с ленивым удалением ушедших.
+
+class RoleSolver:
+
+    def __init__(self, skills: List[List[int]], capacities: List[int],
+                 certificates: Optional[List[List[int]]] = None) -> None:
+        self.skills = [list(map(int, row)) for row in skills]  # Скиллы участников по ролям.
+        self.capacities = list(capacities)  # Количество мест в каждой роли.
+        if sum(self.capacities) < len(self.skills):
+            raise ValueError("Мест в ролях меньше, чем участников")
+        if certificates:  # [[Номер участника, номер роли (с 1), значение скилла], ...], как у "Unit".
+            for num, (skill_num, skill_upgrade) in {i[0]: (i[1], i[2]) for i in certificates}.items():
+                if not 1 <= num <= len(self.skills):
+                    raise ValueError(f"Номер участника- целое число от 1 до {len(self.skills)}")
+                if not 1 <= skill_num <= len(self.capacities):
+                    raise ValueError(f"Номер скилла- целое число от 1 до {len(self.capacities)}")
+                self.skills[num - 1][skill_num - 1] += skill_upgrade
+
+    # Расчет: (общий скилл, номера участников по ролям).
+    def solve(self) -> Tuple[int, List[List[int]]]:
+        skills, k = self.skills, len(self.capacities)
+        role = [-1] * len(skills)  # Текущая роль каждого участника.
+        count = [0] * k  # Занятые места.
+        heaps = [[[] for _ in range(k)] for _ in range(k)]  # heaps[a][b]: (потеря при переходе a -> b, участник).
+
+        def place(p: int, r: int) -> None:
+            role[p] = r
+            for b in range(k):
+                if b != r:
+                    heapq.heappush(heaps[r][b], (skills[p][r] - skills[p][b], p))
+
+        def top(a: int, b: int) -> Tuple[float, int]:
+            heap = heaps[a][b]
+            while heap and role[heap[0][1]] != a:  # Участник уже ушел из роли a.
+                heapq.heappop(heap)
+            return heap[0] if heap else (math.inf, -1)
+
+        for i in range(len(skills)):
+            distance = [-skill for skill in skills[i]]  # Минус прирост при входе участника в роль.
+            previous = [-1] * k
+            edges = [(a, b, *top(a, b)) for a in range(k) for b in range(k) if a != b and count[a]]
+            for _ in range(k - 1):
+                changed = False
+                for a, b, loss, _ in edges:
+                    if distance[a] + loss < distance[b]:
+                        distance[b], previous[b] = distance[a] + loss, a
+                        changed = True
+                if not changed:
+                    break
+            end = min((r for r in range(k) if count[r] < self.capacities[r]), key=distance.__getitem__)
+            movers = {(a, b): p for a, b, _, p in edges}
+            count[end] += 1
+            b = end
+            while previous[b] != -1:  # Сдвигаем участников вдоль цепочки, начиная с конца.
+                a = previous[b]
+                place(movers[a, b], b)
+                b = a
+            place(i, b)
+
+        groups = [[] for _ in range(k)]
+        for p, r in enumerate(role):
+            groups[r].append(p + 1)
+        return sum(skills[p][r] for p, r in enumerate(role)), groups
+
+
+# ================================================
+
+# Пакетная оценка сценариев сертификатов. Базовые скиллы хранятся в двух массивах (разработка и управление), каждый
+# сценарий применяет сертификаты к своей копии массивов, не меняя базовые, и считается точным методом (см.
+# "GroupOptimizer.calculate_exact_benefit"). Сценарии распределяются по процессам пула, базовые массивы передаются
+# каждому процессу один раз при запуске.
+
+_baseline: Tuple[array, array] = (array('q'), array('q'))  # Базовые скиллы в процессе-обработчике.
+
+
+def _load_baseline(dev: array, mgmt: array) -> None:
+    global _baseline
+    _baseline = (dev, mgmt)
+
+
+# Оценка одного сценария: (общий скилл, номера разработчиков, номера менеджеров).
+def _evaluate_scenario(certificates: Optional[List[List[int]]]) -> Tuple[int, Tuple[int, ...], Tuple[int, ...]]:
+    dev, mgmt = array('q', _baseline[0]), array('q', _baseline[1])
+    for num, (skill_num, skill_upgrade) in {i[0]: (i[1], i[2]) for i in certificates or ()}.items():
+        if not 1 <= num <= len(dev):  # Сертификаты несуществующих участников не применяются, как в "GroupBy".
+            continue
+        if skill_num == 1:
+            dev[num - 1] += skill_upgrade
+        elif skill_num == 2:
+            mgmt[num - 1] += skill_upgrade
+        else:
+            raise ValueError("Номер скилла- целое число равное 1 или 2")
+    order = sorted(range(len(dev)), key=lambda i: mgmt[i] - dev[i])  # По убыванию прироста.
+    half = len(order) // 2
+    total = sum(mgmt) + sum(dev[i] - mgmt[i] for i in order[:half])
+    return total, tuple(sorted(i + 1 for i in order[:half])), tuple(sorted(i + 1 for i in order[half:]))
+
+
+class ScenarioEvaluator:
+
+    def __init__(self, skills_dev: str, skills_mgmt: str, workers: int = None) -> None:
+        skills_dev, skills_mgmt = skills_dev.split(), skills_mgmt.split()
+        size = 2 * (len(skills_dev) // 2)  # Как в "GroupBy": при нечетном количестве последний участник не учитывается.
+        self.dev = array('q', map(int, skills_dev[:size]))  # Базовые скиллы разработки.
+        self.mgmt = array('q', map(int, skills_mgmt[:size]))  # Базовые скиллы управления.
+        self.workers = workers or os.cpu_count() or 1
+
+    # Оценка списка сценариев (каждый - список сертификатов, как для "GroupBy"). Результаты в порядке сценариев.
+    def evaluate(self, scenarios: Sequence[Optional[List[List[int]]]]
+                 ) -> List[Tuple[int, Tuple[int, ...], Tuple[int, ...]]]:
+        if self.workers < 2 or len(scenarios) < 2:
+            _load_baseline(self.dev, self.mgmt)
+            return [_evaluate_scenario(scenario) for scenario in scenarios]
+        with ProcessPoolExecutor(self.workers, initializer=_load_baseline, initargs=(self.dev, self.mgmt)) as pool:
+            return list(pool.map(_evaluate_scenario, scenarios,
+                                 chunksize=max(1, len(scenarios) // (4 * self.workers))))
+
 
-skills_dev = '7 10 3 4 11 6 1 6 11 1 10 10 6 6 4 10 12 10'
-skills_mgmt = '10 8 6 6 4 10 2 6 5 5 7 15 3 4 11 6 11 10'
-certificates = [[1, 1, 2], [4, 1, 6], [7, 2, 10], [5, 1, 4], [10, 2, 5], [11, 2, 7], [6, 2, 5]]
+if __name__ == '__main__':
+    skills_dev = '7 10 3 4 11 6 1 6 11 1 10 10 6 6 4 10 12 10'
+    skills_mgmt = '10 8 6 6 4 10 2 6 5 5 7 15 3 4 11 6 11 10'
+    certificates = [[1, 1, 2], [4, 1, 6], [7, 2, 10], [5, 1, 4], [10, 2, 5], [11, 2, 7], [6, 2, 5]]
 
-Groups = GroupBy(skills_dev, skills_mgmt, certificates)
-c = GroupOptimizer(Groups)
+    Groups = GroupBy(skills_dev, skills_mgmt, certificates)
+    c = GroupOptimizer(Groups)
 
-print(c)
+    print(c)
@@ -1,5 +1,13 @@
 import math
-from typing import Dict, Tuple, List
+import csv
+import json
+import mmap
+import struct
+import zlib
+import heapq
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Tuple, List, Optional, Iterable, Sequence
 
 
 def color_text(text, color=None):
@@ -54,60 +62,565 @@ class LinkMetro:
                 (self.v1 == other.v2 and self.v2 == other.v1))
 
 
+# Компактное представление сети в формате CSR: ветви каждой станции лежат подряд в общих массивах "targets" и
+# "weights", а "offsets[i]:offsets[i + 1]" - их диапазон для станции с номером i. Строится по "замороженному"
+# состоянию графа и пересоздается после его изменения.
+class CompactAdjacency:
+
+    def __init__(self, vertex_count: int, ends: Sequence[Tuple[int, int]], links: Sequence[LinkMetro]):
+        degree = [0] * (vertex_count + 1)
+        for i, j in ends:
+            degree[i + 1] += 1
+            degree[j + 1] += 1
+        for i in range(vertex_count):
+            degree[i + 1] += degree[i]
+        self.offsets = array('q', degree)  # Начало списка ветвей каждой станции.
+        position = degree[:-1]
+        self.targets = array('q', [0]) * (2 * len(ends))  # Номер смежной станции.
+        self.weights = array('d', [0]) * (2 * len(ends))  # Длина ветви.
+        self.slots: List[Optional[LinkMetro]] = [None] * (2 * len(ends))  # Исходная ветвь (для вывода маршрута).
+        for (i, j), link in zip(ends, links):
+            for a, b in ((i, j), (j, i)):
+                slot = position[a]
+                self.targets[slot], self.weights[slot], self.slots[slot] = b, link.distance, link
+                position[a] += 1
+
+
+# Дерево кратчайших путей от одной стартовой станции. Вместе с деревом хранится незавершенная очередь Дейкстры,
+# поэтому поиск можно остановить, как только нужная станция окончательно посчитана, и продолжить с того же места
+# при следующем запросе. Станции задаются номерами в "CompactAdjacency".
+class ShortestPathTree:
+
+    def __init__(self, adjacency: CompactAdjacency, start: int):
+        self.adjacency = adjacency
+        self.distance: Dict[int, float | int] = {start: 0}  # Лучшие известные расстояния от старта.
+        self.previous: Dict[int, Tuple[int, int]] = {start: (-1, -1)}  # Предыдущая станция и номер ветви в CSR.
+        self.settled = set()  # Станции, расстояние до которых окончательное.
+        self.queue = [(0, start)]  # Очередь с приоритетом по расстоянию.
+
+    # Продолжение алгоритма Дейкстры, пока станция "end" не будет посчитана окончательно или очередь не опустеет.
+    def settle(self, end: int) -> bool:
+        distance, previous, settled, queue = self.distance, self.previous, self.settled, self.queue
+        offsets, targets, weights = self.adjacency.offsets, self.adjacency.targets, self.adjacency.weights
+        while end not in settled and queue:
+            current, i = heapq.heappop(queue)
+            if i in settled:
+                continue
+            settled.add(i)
+            for slot in range(offsets[i], offsets[i + 1]):
+                v = targets[slot]
+                if v not in settled and current + weights[slot] < distance.get(v, math.inf):
+                    distance[v] = current + weights[slot]
+                    previous[v] = (i, slot)
+                    heapq.heappush(queue, (distance[v], v))
+        return end in settled
+
+
+# Контрольная сумма сети: порядок станций и все ветви (номера концов и длины, без учета порядка добавления).
+# Предрасчитанные данные применимы только к графу с той же суммой.
+def network_checksum(vertex: Sequence[Station], ends: Sequence[Tuple[int, int]], links: Sequence[LinkMetro]) -> int:
+    edges = sorted((min(i, j), max(i, j), link.distance) for (i, j), link in zip(ends, links) if -1 not in (i, j))
+    return zlib.crc32(repr(edges).encode(), zlib.crc32('\n'.join(v.name for v in vertex).encode()))
+
+
+# Предрасчитанные таблицы кратчайших расстояний и следующих станций для всех пар станций. Маршрут восстанавливается
+# переходами по таблице следующих станций за время, пропорциональное его длине. Таблицы можно сохранить в
+# двоичный файл и при запуске отобразить в память без чтения целиком.
+class AllPairsTable:
+    MAGIC = b'APT1'
+    HEADER = struct.Struct('<4sqI4x')  # Сигнатура, количество станций, контрольная сумма названий станций.
+
+    def __init__(self, size: int, distance: Sequence[float], next_hop: Sequence[int], checksum: int = 0):
+        self.size = size  # Количество станций.
+        self.distance = distance  # distance[s * size + t] - кратчайшее расстояние от s до t.
+        self.next_hop = next_hop  # next_hop[s * size + t] - следующая после s станция на пути к t (-1 - пути нет).
+        self.checksum = checksum
+
+    # Построение таблиц: полный алгоритм Дейкстры из каждой станции. Первая станция пути наследуется от
+    # предшественника в порядке окончательного подсчета.
+    @classmethod
+    def build(cls, adjacency: CompactAdjacency, checksum: int) -> 'AllPairsTable':
+        size = len(adjacency.offsets) - 1
+        offsets, targets, weights = adjacency.offsets, adjacency.targets, adjacency.weights
+        distance = array('d', [math.inf]) * (size * size)
+        next_hop = array('i', [-1]) * (size * size)
+        for source in range(size):
+            row = source * size
+            best, first = {source: 0}, {source: source}
+            queue, settled = [(0, source)], set()
+            while queue:
+                current, i = heapq.heappop(queue)
+                if i in settled:
+                    continue
+                settled.add(i)
+                distance[row + i], next_hop[row + i] = current, first[i]
+                for slot in range(offsets[i], offsets[i + 1]):
+                    v = targets[slot]
+                    if v not in settled and current + weights[slot] < best.get(v, math.inf):
+                        best[v] = current + weights[slot]
+                        first[v] = v if i == source else first[i]
+                        heapq.heappush(queue, (best[v], v))
+        return cls(size, distance, next_hop, checksum)
+
+    # Маршрут от s до t в виде списка номеров станций.
+    def route(self, start: int, end: int) -> List[int]:
+        size, next_hop = self.size, self.next_hop
+        if not (0 <= start < size and 0 <= end < size):  # Станция добавлена после построения таблиц.
+            raise IndexError("Станция отсутствует в таблице маршрутов")
+        if next_hop[start * size + end] == -1:
+            raise RouteError
+        rout = [start]
+        while rout[-1] != end:
+            rout.append(next_hop[rout[-1] * size + end])
+        return rout
+
+    # Копия таблиц в памяти.
+    def copy(self) -> 'AllPairsTable':
+        return AllPairsTable(self.size, array('d', self.distance), array('i', self.next_hop), self.checksum)
+
+    # Учет новой ветви u-v длины w между уже известными станциями: путь s -> t мог стать короче, пройдя через нее
+    # в любом направлении. Пересчет за O(n²) без повторного поиска.
+    def add_link(self, u: int, v: int, w: float) -> None:
+        size, distance, next_hop = self.size, self.distance, self.next_hop
+        for s in range(size):
+            row = s * size
+            for a, b in ((u, v), (v, u)):
+                to_a = distance[row + a]
+                if to_a == math.inf:
+                    continue
+                hop = b if s == a else next_hop[row + a]
+                base, from_b = to_a + w, b * size
+                for t in range(size):
+                    if base + distance[from_b + t] < distance[row + t]:
+                        distance[row + t], next_hop[row + t] = base + distance[from_b + t], hop
+
+    # Сохранение таблиц в двоичный файл.
+    def save(self, path: str) -> None:
+        with open(path, 'wb') as file:
+            file.write(self.HEADER.pack(self.MAGIC, self.size, self.checksum))
+            array('d', self.distance).tofile(file)
+            array('i', self.next_hop).tofile(file)
+
+    # Отображение сохраненных таблиц в память. Страницы копируются при записи, поэтому последующие изменения
+    # сети меняют таблицы в памяти, но не файл.
+    @classmethod
+    def load(cls, path: str) -> 'AllPairsTable':
+        with open(path, 'rb') as file:
+            table = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+        magic, size, checksum = cls.HEADER.unpack_from(table)
+        if magic != cls.MAGIC:
+            raise ValueError("Файл не является таблицей маршрутов")
+        view = memoryview(table)
+        middle = cls.HEADER.size + size * size * 8
+        return cls(size, view[cls.HEADER.size:middle].cast('d'), view[middle:].cast('i'), checksum)
+
+
+# Иерархия сжатия (contraction hierarchies) для больших сетей. Станции по очереди "сжимаются" в порядке
+# важности: сжатая станция удаляется из сети, а пути через нее сохраняются ярлыками между ее соседями, если у них
+# нет пути не длиннее в обход. Каждая ветвь и каждый ярлык хранятся у менее важной из двух станций и ведут вверх
+# по иерархии, поэтому поиск ведется из начала и из конца только вверх и посещает лишь малую часть сети. Ярлык
+# помнит сжатую станцию, через которую он проходит, и разворачивается обратно в исходные ветви.
+class ContractionHierarchy:
+    MAGIC = b'CHv1'
+    HEADER = struct.Struct('<4sqqI4x')  # Сигнатура, количество станций, количество ветвей вверх, контрольная сумма.
+    WITNESS_LIMIT = 64  # Сколько станций просматривает поиск обходного пути, прежде чем добавить ярлык.
+
+    def __init__(self, rank: Sequence[int], offsets: Sequence[int], targets: Sequence[int],
+                 weights: Sequence[float], middle: Sequence[int], checksum: int = 0):
+        self.size = len(rank)  # Количество станций.
+        self.rank = rank  # Порядковый номер сжатия станции (чем больше, тем станция важнее).
+        self.offsets = offsets  # Ветви вверх в формате CSR, как в "CompactAdjacency".
+        self.targets = targets
+        self.weights = weights
+        self.middle = middle  # Сжатая станция, через которую проходит ярлык (-1 - исходная ветвь).
+        self.checksum = checksum
+
+    # Поиск обходных путей от станции "u" в оставшейся сети без станции "skip", не длиннее "limit" и не дальше
+    # "WITNESS_LIMIT" станций.
+    @classmethod
+    def __witness(cls, adj: List[Dict[int, Tuple[float, int]]], u: int, skip: int,
+                  limit: float) -> Dict[int, float]:
+        distance, settled, queue = {u: 0}, set(), [(0, u)]
+        while queue and len(settled) < cls.WITNESS_LIMIT:
+            current, i = heapq.heappop(queue)
+            if current > limit:
+                break
+            if i in settled:
+                continue
+            settled.add(i)
+            for v, (weight, _) in adj[i].items():
+                if v != skip and current + weight < distance.get(v, math.inf):
+                    distance[v] = current + weight
+                    heapq.heappush(queue, (distance[v], v))
+        return distance
+
+    # Ярлыки, необходимые при сжатии станции "v": пары соседей, для которых путь через "v" кратчайший.
+    @classmethod
+    def __shortcuts(cls, adj: List[Dict[int, Tuple[float, int]]], v: int) -> List[Tuple[int, int, float]]:
+        neighbours = list(adj[v].items())
+        longest = max((weight for _, (weight, _) in neighbours), default=0)
+        shortcuts = []
+        for k, (u, (to_u, _)) in enumerate(neighbours[:-1]):
+            witness = cls.__witness(adj, u, v, to_u + longest)
+            for w, (to_w, _) in neighbours[k + 1:]:
+                if to_u + to_w < witness.get(w, math.inf):
+                    shortcuts.append((u, w, to_u + to_w))
+        return shortcuts
+
+    # Предобработка: порядок сжатия по разности "добавленные ярлыки - удаленные ветви" с учетом уже сжатых
+    # соседей, приоритеты в очереди пересчитываются лениво при извлечении.
+    @classmethod
+    def build(cls, adjacency: CompactAdjacency, checksum: int) -> 'ContractionHierarchy':
+        size = len(adjacency.offsets) - 1
+        offsets, targets, weights = adjacency.offsets, adjacency.targets, adjacency.weights
+        adj: List[Dict[int, Tuple[float, int]]] = [{} for _ in range(size)]  # Оставшаяся сеть: длина и середина.
+        for i in range(size):
+            for slot in range(offsets[i], offsets[i + 1]):
+                if targets[slot] != i and weights[slot] < adj[i].get(targets[slot], (math.inf, -1))[0]:
+                    adj[i][targets[slot]] = (weights[slot], -1)
+        deleted = [0] * size  # Количество уже сжатых соседей.
+        priority = lambda v: len(cls.__shortcuts(adj, v)) - len(adj[v]) + deleted[v]
+        queue = [(priority(v), v) for v in range(size)]
+        heapq.heapify(queue)
+        rank = array('q', [-1]) * size
+        up: List[List[Tuple[int, float, int]]] = [[] for _ in range(size)]
+        order = 0
+        while queue:
+            _, v = heapq.heappop(queue)
+            if rank[v] != -1:
+                continue
+            if queue and (current := priority(v)) > queue[0][0]:  # Приоритет устарел - возвращаем в очередь.
+                heapq.heappush(queue, (current, v))
+                continue
+            for u, w, weight in cls.__shortcuts(adj, v):
+                if weight < adj[u].get(w, (math.inf, -1))[0]:
+                    adj[u][w] = adj[w][u] = (weight, v)
+            rank[v], order = order, order + 1
+            for u, (weight, middle) in adj[v].items():
+                up[v].append((u, weight, middle))
+                del adj[u][v]
+                deleted[u] += 1
+            adj[v] = {}
+        ups = array('q', [0])
+        for edges in up:
+            ups.append(ups[-1] + len(edges))
+        return cls(rank, ups, array('q', (u for edges in up for u, _, _ in edges)),
+                   array('d', (weight for edges in up for _, weight, _ in edges)),
+                   array('q', (middle for edges in up for _, _, middle in edges)), checksum)
+
+    # Двунаправленный поиск вверх по иерархии. Сторона поиска останавливается, когда ее очередь не может
+    # улучшить лучший найденный путь через общую станцию.
+    def route(self, start: int, end: int) -> List[int]:
+        if not (0 <= start < self.size and 0 <= end < self.size):  # Станция добавлена после построения иерархии.
+            raise IndexError("Станция отсутствует в иерархии сжатия")
+        offsets, targets, weights = self.offsets, self.targets, self.weights
+        distance = ({start: 0}, {end: 0})
+        previous = ({start: -1}, {end: -1})
+        queues = ([(0, start)], [(0, end)])
+        settled = (set(), set())
+        best, meeting = (0, start) if start == end else (math.inf, -1)
+        while any(queue and queue[0][0] < best for queue in queues):
+            for side in (0, 1):
+                queue, dist, prev, done = queues[side], distance[side], previous[side], settled[side]
+                if not queue or queue[0][0] >= best:
+                    continue
+                current, i = heapq.heappop(queue)
+                if i in done:
+                    continue
+                done.add(i)
+                if (total := current + distance[1 - side].get(i, math.inf)) < best:
+                    best, meeting = total, i
+                for slot in range(offsets[i], offsets[i + 1]):
+                    v = targets[slot]
+                    if current + weights[slot] < dist.get(v, math.inf):
+                        dist[v], prev[v] = current + weights[slot], i
+                        heapq.heappush(queue, (dist[v], v))
+        if meeting == -1:
+            raise RouteError
+        half = [meeting]
+        while previous[0][half[-1]] != -1:
+            half.append(previous[0][half[-1]])
+        stations = [start]
+        for i in range(len(half) - 1, 0, -1):
+            stations += self.__unpack(half[i], half[i - 1])
+        i = meeting
+        while previous[1][i] != -1:
+            stations += self.__unpack(i, previous[1][i])
+            i = previous[1][i]
+        return stations
+
+    # Разворачивание ветви иерархии a -> b в последовательность станций после "a" до "b" включительно.
+    def __unpack(self, a: int, b: int) -> List[int]:
+        stations, stack = [], [(a, b)]
+        while stack:
+            u, w = stack.pop()
+            low, high = (u, w) if self.rank[u] < self.rank[w] else (w, u)
+            slot = next(s for s in range(self.offsets[low], self.offsets[low + 1]) if self.targets[s] == high)
+            if (middle := self.middle[slot]) == -1:
+                stations.append(w)
+            else:
+                stack += [(middle, w), (u, middle)]
+        return stations
+
+    # Сохранение иерархии в двоичный файл.
+    def save(self, path: str) -> None:
+        with open(path, 'wb') as file:
+            file.write(self.HEADER.pack(self.MAGIC, self.size, len(self.targets), self.checksum))
+            for data, typecode in ((self.rank, 'q'), (self.offsets, 'q'), (self.targets, 'q'),
+                                   (self.weights, 'd'), (self.middle, 'q')):
+                array(typecode, data).tofile(file)
+
+    # Отображение сохраненной иерархии в память (страницы копируются при записи, как у "AllPairsTable").
+    @classmethod
+    def load(cls, path: str) -> 'ContractionHierarchy':
+        with open(path, 'rb') as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+        magic, size, count, checksum = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC:
+            raise ValueError("Файл не является иерархией сжатия")
+        view, position, parts = memoryview(data), cls.HEADER.size, []
+        for length, typecode in ((size, 'q'), (size + 1, 'q'), (count, 'q'), (count, 'd'), (count, 'q')):
+            parts.append(view[position:position + 8 * length].cast(typecode))
+            position += 8 * length
+        return cls(*parts, checksum)
+
+
+# Неизменяемый снимок графа для параллельных запросов. Снимок хранит только готовые к чтению структуры
+# (CSR, таблицы, иерархию), а состояние каждого поиска создается локально, поэтому один снимок можно
+# одновременно опрашивать из любого количества потоков или задач asyncio.
+class FrozenGraph:
+
+    def __init__(self, vertex: Sequence[Station], index: Dict[Station, int], link_keys: Dict[frozenset, LinkMetro],
+                 adjacency: CompactAdjacency, table: Optional[AllPairsTable] = None,
+                 hierarchy: Optional[ContractionHierarchy] = None):
+        self.vertex = tuple(vertex)
+        self.index = dict(index)
+        self.link_keys = dict(link_keys)
+        self.adjacency = adjacency
+        self.table = table
+        self.hierarchy = hierarchy
+
+    # Маршрут между двумя станциями: (станции, ветви). TypeError - не станция, ValueError со списком
+    # отсутствующих станций, RouteError - маршрута нет.
+    def route(self, start_v: Station, end_v: Station) -> Tuple[List[Station], List[LinkMetro]]:
+        if type(start_v) != Station or type(end_v) != Station:
+            raise TypeError
+        if off_base := {v for v in (start_v, end_v) if v not in self.index}:
+            raise ValueError(off_base)
+        start, end = self.index[start_v], self.index[end_v]
+        if self.table is not None or self.hierarchy is not None:
+            stations = (self.table or self.hierarchy).route(start, end)
+            return ([self.vertex[i] for i in stations],
+                    [self.link_keys[frozenset((id(self.vertex[i]), id(self.vertex[j])))]
+                     for i, j in zip(stations, stations[1:])])
+        tree = ShortestPathTree(self.adjacency, start)
+        if not tree.settle(end):
+            raise RouteError
+        i, rout = end, [[end_v], []]
+        while i != start:
+            i, slot = tree.previous[i]
+            rout[0].append(self.vertex[i])
+            rout[1].append(self.adjacency.slots[slot])
+        rout[0].reverse()
+        rout[1].reverse()
+        return rout[0], rout[1]
+
+    # Маршрут или None, если станции не связаны, отсутствуют в снимке или не являются станциями: одна неверная
+    # пара не прерывает весь пакет.
+    def __route_or_none(self, pair: Tuple[Station, Station]) -> Optional[Tuple[List[Station], List[LinkMetro]]]:
+        try:
+            return self.route(*pair)
+        except (RouteError, TypeError, ValueError):
+            return None
+
+    # Пакетный расчет маршрутов в пуле потоков. Результаты возвращаются в порядке пар.
+    def route_many(self, pairs: Iterable[Tuple[Station, Station]],
+                   workers: Optional[int] = None) -> List[Optional[Tuple[List[Station], List[LinkMetro]]]]:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(self.__route_or_none, pairs))
+
+
 # Граф.
 class LinkedGraph:
 
     def __init__(self):
         self.links = []  # Список для хранения ветвей графа.
-        self.vertex = []  # Список для хранения вершин графа.
-        self.route = None
+        self.vertex = []  # Список для хранения вершин графа. Номер станции - ее позиция в списке.
+        self.index: Dict[Station, int] = {}  # Номера станций.
+        self.names: Dict[str, Station] = {}  # Станции по названиям.
+        self.link_keys: Dict[frozenset, LinkMetro] = {}  # Ветви по парам станций (проверка дубликатов за O(1)).
+        self.ends: List[Tuple[int, int]] = []  # Номера станций на концах каждой ветви из "links".
+        self.adjacency: Optional[CompactAdjacency] = None  # CSR-представление, строится при первом запросе.
+        self.trees: Dict[int, ShortestPathTree] = {}  # Кэш деревьев кратчайших путей по стартовым станциям.
+        self.table: Optional[AllPairsTable] = None  # Таблицы всех пар (по запросу, см. "precompute").
+        self.hierarchy: Optional[ContractionHierarchy] = None  # Иерархия сжатия (по запросу, см. "contract").
+        self.snapshot: Optional[FrozenGraph] = None  # Опубликованный снимок для параллельных запросов.
+        self.version: int = 0  # Номер изменения сети: растет при добавлении станций и ветвей.
+        self.snapshot_version: int = -1  # Номер изменения, с которого сделан опубликованный снимок.
 
     def add_vertex(self, v: Station) -> None:
         try:
             self.__valid_type(v)
-            if v not in self.vertex:
+            if v not in self.index:
+                self.index[v] = len(self.vertex)
+                self.names.setdefault(v.name, v)
                 self.vertex.append(v)
+                self.adjacency = None
+                self.version += 1
+                self.table = None  # Таблицы и иерархия построены для прежнего числа станций.
+                self.hierarchy = None
         except:
             print(color_text(f'Станция "{v}" должна быть объектом класса "Station"!', 'red'))
 
     def add_link(self, link: LinkMetro) -> None:
-        if link not in self.links:
+        if (key := frozenset((id(link.v1), id(link.v2)))) not in self.link_keys:
+            known = link.v1 in self.index and link.v2 in self.index
             self.links.append(link)
+            self.link_keys[key] = link
             self.add_vertex(link.v1)
             self.add_vertex(link.v2)
+            self.ends.append((self.index.get(link.v1, -1), self.index.get(link.v2, -1)))
+            self.adjacency = None  # Сеть изменилась - CSR и сохраненные деревья путей устарели.
+            self.trees.clear()
+            self.version += 1
+            self.hierarchy = None
+            if self.table is not None:  # Между известными станциями таблицы дополняются, иначе сбрасываются.
+                if known and self.snapshot is not None and self.snapshot.table is self.table:
+                    self.table = self.table.copy()  # Таблицы опубликованного снимка не меняются.
+                if known:
+                    self.table.add_link(*self.ends[-1], link.distance)
+                    self.table.checksum = self.checksum()
+                else:
+                    self.table = None
 
-    # Согласно алгоритму Дейкстры назначаем длины кратчайших путей от стартовой вершины до остальных
-    # вершин равными бесконечности. Самой стартовой вершине назначаем длину кратчайшего пути равной нулю.
-    def __init_dijkstra_distances(self, start_v: Station) -> Dict[Station, float]:
-        return {i: float(math.inf) if i != start_v else 0 for i in self.vertex}
-
-    # Улучшаем расстояния от вершины, находящейся первой в очереди до остальных смежных к ней вершин
-    # графа на каждой итерации, в результате получим словарь с улучшенными расстояниями от каждой из
-    # вершин графа до стартовой.
-    def __update_distances(self, start_v: Station, end_v: Station) -> Dict[Station, float | int]:
-        improved_distance = self.__init_dijkstra_distances(start_v)
-        queue = [start_v]  # Создаем простую очередь("Первым пришел-первым ушел").
-        while queue:
-            i = queue[0]
-            for k, v in i.links:
-                if improved_distance[v] > k.distance + improved_distance[i]:
-                    improved_distance[v] = k.distance + improved_distance[i]
-                    queue.append(v)
-            del queue[0]
-        if improved_distance[end_v] == math.inf:  # Проверка что связь между конечной и начальной станциями существует.
+    # Загрузка сети за один проход из строк (станция 1, станция 2[, дистанция]). Станции создаются по названиям
+    # или берутся уже существующие.
+    def add_links(self, rows: Iterable[Sequence]) -> None:
+        names, index, keys = self.names, self.index, self.link_keys
+        for row in rows:
+            v1, v2 = names.get(row[0]), names.get(row[1])
+            if v1 is None:
+                self.add_vertex(v1 := Station(row[0]))
+            if v2 is None:
+                self.add_vertex(v2 := Station(row[1]))
+            if (key := frozenset((id(v1), id(v2)))) in keys:
+                continue
+            keys[key] = LinkMetro(v1, v2, *row[2:3])
+            self.links.append(keys[key])
+            self.ends.append((index[v1], index[v2]))
+        self.adjacency = None
+        self.trees.clear()
+        self.table = None
+        self.hierarchy = None
+        self.version += 1
+
+    # Загрузка сети из CSV-файла со строками "станция 1,станция 2,дистанция" (дистанция необязательна).
+    @classmethod
+    def from_csv(cls, path: str, header: bool = True) -> 'LinkedGraph':
+        graph = cls()
+        with open(path, newline='', encoding='utf-8') as file:
+            rows = csv.reader(file)
+            if header:
+                next(rows, None)
+            graph.add_links((row[0], row[1], cls.__number(row[2])) if len(row) > 2 and row[2] else row[:2]
+                            for row in rows if row)
+        return graph
+
+    # Загрузка сети из JSON-файла: список ветвей [станция 1, станция 2, дистанция] - сам по себе или под ключом
+    # "links".
+    @classmethod
+    def from_json(cls, path: str) -> 'LinkedGraph':
+        graph = cls()
+        with open(path, encoding='utf-8') as file:
+            data = json.load(file)
+        graph.add_links(data['links'] if isinstance(data, dict) else data)
+        return graph
+
+    @staticmethod
+    def __number(text: str) -> int | float:
+        value = float(text)
+        return int(value) if value.is_integer() else value
+
+    # Компактное представление сети. Строится один раз после изменений графа.
+    def compact(self) -> CompactAdjacency:
+        if self.adjacency is None:
+            valid = [(ends, link) for ends, link in zip(self.ends, self.links) if -1 not in ends]
+            self.adjacency = CompactAdjacency(len(self.vertex), [ends for ends, _ in valid],
+                                              [link for _, link in valid])
+        return self.adjacency
+
+    # Контрольная сумма текущего состояния сети (см. "network_checksum").
+    def checksum(self) -> int:
+        return network_checksum(self.vertex, self.ends, self.links)
+
+    # Предрасчет таблиц всех пар станций. Дальнейшие маршруты восстанавливаются по таблицам.
+    def precompute(self) -> AllPairsTable:
+        self.table = AllPairsTable.build(self.compact(), self.checksum())
+        return self.table
+
+    # Загрузка сохраненных таблиц, построенных для этого же графа.
+    def load_table(self, path: str) -> AllPairsTable:
+        table = AllPairsTable.load(path)
+        if table.size != len(self.vertex) or table.checksum != self.checksum():
+            raise ValueError("Таблица маршрутов построена для другой сети")
+        self.table = table
+        return table
+
+    # Построение иерархии сжатия для больших сетей. Сбрасывается при любом изменении графа.
+    def contract(self) -> ContractionHierarchy:
+        self.hierarchy = ContractionHierarchy.build(self.compact(), self.checksum())
+        return self.hierarchy
+
+    # Загрузка сохраненной иерархии, построенной для этого же графа.
+    def load_hierarchy(self, path: str) -> ContractionHierarchy:
+        hierarchy = ContractionHierarchy.load(path)
+        if hierarchy.size != len(self.vertex) or hierarchy.checksum != self.checksum():
+            raise ValueError("Иерархия сжатия построена для другой сети")
+        self.hierarchy = hierarchy
+        return hierarchy
+
+    # Публикация неизменяемого снимка текущего состояния графа. Новый снимок заменяет прежний одним
+    # присваиванием, запросы, уже начатые на прежнем снимке, завершаются на нем.
+    def freeze(self) -> FrozenGraph:
+        self.snapshot = FrozenGraph(self.vertex, self.index, self.link_keys, self.compact(), self.table,
+                                    self.hierarchy)
+        self.snapshot_version = self.version
+        return self.snapshot
+
+    # Пакетный расчет маршрутов по опубликованному снимку. Если сеть изменилась после публикации (или снимка
+    # еще нет), сначала публикуется новый снимок.
+    def route_many(self, pairs: Iterable[Tuple[Station, Station]],
+                   workers: Optional[int] = None) -> List[Optional[Tuple[List[Station], List[LinkMetro]]]]:
+        snapshot = self.snapshot if self.snapshot_version == self.version else self.freeze()
+        return snapshot.route_many(pairs, workers)
+
+    # Алгоритм Дейкстры на куче с ранним выходом: поиск останавливается, как только конечная станция посчитана.
+    # Деревья кратчайших путей кэшируются по стартовой станции, так что повторные запросы из той же станции
+    # отвечаются проходом по готовому дереву.
+    def __update_distances(self, start: int, end: int) -> ShortestPathTree:
+        tree = self.trees.get(start)
+        if tree is None:
+            tree = self.trees[start] = ShortestPathTree(self.compact(), start)
+        if not tree.settle(end):  # Проверка что связь между конечной и начальной станциями существует.
             raise RouteError
-        return improved_distance
+        return tree
 
-    # Восстанавливаем маршрут от конечной вершины графа до стартовой.
+    # Восстанавливаем маршрут от конечной вершины графа до стартовой по сохраненным предшественникам.
     def __restore_route(self, start_v: Station, end_v: Station) -> Tuple[List[Station], List[LinkMetro]]:
-        improved_distance = self.__update_distances(start_v, end_v)
-        i, rout = end_v, [[end_v], []]
-        while i != start_v:  # Цикл, восстанавливающий маршрут от конечной вершины графа до стартовой.
-            for k, v in i.links:
-                if improved_distance[i] - k.distance == improved_distance[v]:
-                    rout[0].insert(0, v)  # Вершины.
-                    rout[1].insert(0, k)  # Ветви.
-                    i = v
+        start, end = self.index[start_v], self.index[end_v]
+        if self.table is not None or self.hierarchy is not None:  # Таблицы всех пар или иерархия сжатия.
+            stations = (self.table or self.hierarchy).route(start, end)
+            return ([self.vertex[i] for i in stations],
+                    [self.link_keys[frozenset((id(self.vertex[i]), id(self.vertex[j])))]
+                     for i, j in zip(stations, stations[1:])])
+        tree = self.__update_distances(start, end)
+        i, rout = end, [[end_v], []]
+        while i != start:  # Цикл, восстанавливающий маршрут от конечной вершины графа до стартовой.
+            i, slot = tree.previous[i]
+            rout[0].append(self.vertex[i])  # Вершины.
+            rout[1].append(tree.adjacency.slots[slot])  # Ветви.
+        rout[0].reverse()
+        rout[1].reverse()
         return rout[0], rout[1]
 
     # Вывод итоговой информации по маршруту.
@@ -124,14 +637,13 @@ class LinkedGraph:
             return color_text("Начальная и конечная станция не связаны маршрутом!", 'red')
         except TypeError:
             return color_text("Неверный тип входных данных!", 'red')
-        except ValueError:
-            return color_text(f"Станция(и): {','.join(map(str, self.off_base))} отсутствует(ют) в базе!", 'red')
+        except ValueError as error:
+            return color_text(f"Станция(и): {','.join(map(str, error.args[0]))} отсутствует(ют) в базе!", 'red')
 
     # Проверка наличия вершины в базе.
     def __valid_value(self, start_v: Station, end_v: Station):
-        if (s := {start_v, end_v} - set(self.vertex)) != set():
-            self.off_base = s
-            raise ValueError
+        if (s := {v for v in (start_v, end_v) if v not in self.index}) != set():
+            raise ValueError(s)
 
     # Проверка вершины на верный тип данных.
     @staticmethod
@@ -1,42 +1,354 @@
-from typing import List, Callable
-import copy
+from typing import List, Callable, Any, Optional, Iterable, Iterator, Tuple
+from bisect import bisect_left, bisect_right
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from operator import itemgetter
+import heapq
+import os
+import pickle
+import sys
+import tempfile
+
+RUN = 32  # Длина начальных участков, которые сортируются вставками перед слияниями.
+MIN_GALLOP = 7  # После скольких подряд выигрышей одного участка слияние переходит к поиску границы бинарным поиском.
+
+
+# Слияние отсортированных участков src[lo:mid] и src[mid:hi] в dst[lo:hi]. При равенстве первым берется элемент
+# левого участка, поэтому слияние устойчиво. Если заданы "src_vals"/"dst_vals", значения переносятся вместе с
+# ключами.
+def merge_into(src: List, dst: List, lo: int, mid: int, hi: int,
+               src_vals: Optional[List] = None, dst_vals: Optional[List] = None) -> None:
+    if not src[mid] < src[mid - 1]:  # Участки уже идут по порядку - простое копирование.
+        dst[lo:hi] = src[lo:hi]
+        if src_vals is not None:
+            dst_vals[lo:hi] = src_vals[lo:hi]
+        return
+    i, j, k = lo, mid, lo
+    while i < mid and j < hi:
+        if src[j] < src[i]:
+            dst[k] = src[j]
+            if src_vals is not None:
+                dst_vals[k] = src_vals[j]
+            j += 1
+        else:
+            dst[k] = src[i]
+            if src_vals is not None:
+                dst_vals[k] = src_vals[i]
+            i += 1
+        k += 1
+    if i < mid:  # Остаток одного из участков переносим срезом.
+        dst[k:hi] = src[i:mid]
+        if src_vals is not None:
+            dst_vals[k:hi] = src_vals[i:mid]
+    else:
+        dst[k:hi] = src[j:hi]
+        if src_vals is not None:
+            dst_vals[k:hi] = src_vals[j:hi]
 
 
 def merger_end(list1: List[int], list2: List[int]) -> List[int]:
-    list_sort = []
-    s1 = copy.deepcopy(list1)
-    s2 = copy.deepcopy(list2)
+    s0 = list1 + list2
+    list_sort = s0[:]
+    if list1 and list2:
+        merge_into(s0, list_sort, 0, len(list1), len(s0))
+    return list_sort
+
+
+# Сортировка вставками участка keys[lo:hi]: место элемента ищется бинарным поиском, сдвиг выполняется срезом.
+def insertion_sort(keys: List, lo: int, hi: int, vals: Optional[List] = None) -> None:
+    for i in range(lo + 1, hi):
+        k = keys[i]
+        j = bisect_right(keys, k, lo, i)
+        if j < i:
+            keys[j + 1:i + 1] = keys[j:i]
+            keys[j] = k
+            if vals is not None:
+                v = vals[i]
+                vals[j + 1:i + 1] = vals[j:i]
+                vals[j] = v
+
+
+# Восходящая сортировка слиянием без рекурсии: участки длины RUN сортируются вставками, затем сливаются попарно с
+# удвоением ширины, попеременно из основного списка в один вспомогательный буфер и обратно. При "key" ключи и
+# значения хранятся в параллельных списках и переносятся вместе. Убывающий порядок получается разворотом до и
+# после сортировки, что сохраняет устойчивость.
+def sort(s0: List[Any], key: Optional[Callable[[Any], Any]] = None, reverse: bool = False) -> List[Any]:
+    n = len(s0)
+    keys = list(s0) if key is None else [key(x) for x in s0]
+    vals = None if key is None else list(s0)
+    if reverse:
+        keys.reverse()
+        if vals is not None:
+            vals.reverse()
+
+    for lo in range(0, n, RUN):
+        insertion_sort(keys, lo, min(lo + RUN, n), vals)
+
+    src, dst = keys, [None] * n
+    src_vals, dst_vals = vals, (None if vals is None else [None] * n)
+    width = RUN
+    while width < n:
+        for lo in range(0, n, 2 * width):
+            mid, hi = min(lo + width, n), min(lo + 2 * width, n)
+            if mid < hi:
+                merge_into(src, dst, lo, mid, hi, src_vals, dst_vals)
+            else:  # Одиночный хвост без пары.
+                dst[lo:hi] = src[lo:hi]
+                if src_vals is not None:
+                    dst_vals[lo:hi] = src_vals[lo:hi]
+        src, dst = dst, src
+        src_vals, dst_vals = dst_vals, src_vals
+        width *= 2
+
+    list_sort = src if vals is None else src_vals
+    if reverse:
+        list_sort.reverse()
+    return list_sort
+
+
+# Минимальная длина участка для естественной сортировки: от RUN / 2 до RUN, так чтобы n / minrun было близко к
+# степени двойки и слияния оставались сбалансированными.
+def min_run(n: int) -> int:
+    r = 0
+    while n >= RUN:
+        r |= n & 1
+        n >>= 1
+    return n + r
 
-    while s1 and s2:
-        if s1[-1] > s2[-1]:
-            list_sort.insert(0, s1.pop())
+
+# Слияние соседних участков keys[lo:mid] и keys[mid:hi] на месте через копию левого участка. Когда один участок
+# выигрывает MIN_GALLOP раз подряд, вся его серия до следующего элемента другого участка находится бинарным
+# поиском и переносится срезом.
+def merge_runs(keys: List, lo: int, mid: int, hi: int, vals: Optional[List] = None) -> None:
+    lo = bisect_right(keys, keys[mid], lo, mid)  # Начало левого участка, которое уже на месте.
+    hi = bisect_left(keys, keys[mid - 1], mid, hi)  # Конец правого участка, который уже на месте.
+    if lo == mid or mid == hi:
+        return
+    tmp = keys[lo:mid]
+    tmp_vals = None if vals is None else vals[lo:mid]
+    i, j, k, la = 0, mid, lo, mid - lo
+    wins_left = wins_right = 0
+    while i < la and j < hi:
+        if keys[j] < tmp[i]:
+            keys[k] = keys[j]
+            if vals is not None:
+                vals[k] = vals[j]
+            j, k, wins_right, wins_left = j + 1, k + 1, wins_right + 1, 0
+            if wins_right >= MIN_GALLOP and j < hi:  # Все элементы правого участка меньше tmp[i].
+                e = bisect_left(keys, tmp[i], j, hi)
+                keys[k:k + e - j] = keys[j:e]
+                if vals is not None:
+                    vals[k:k + e - j] = vals[j:e]
+                k, j, wins_right = k + e - j, e, 0
+        else:
+            keys[k] = tmp[i]
+            if vals is not None:
+                vals[k] = tmp_vals[i]
+            i, k, wins_left, wins_right = i + 1, k + 1, wins_left + 1, 0
+            if wins_left >= MIN_GALLOP and i < la:  # Все элементы левого участка не больше keys[j].
+                e = bisect_right(tmp, keys[j], i, la)
+                keys[k:k + e - i] = tmp[i:e]
+                if vals is not None:
+                    vals[k:k + e - i] = tmp_vals[i:e]
+                k, i, wins_left = k + e - i, e, 0
+    if i < la:  # Остаток правого участка уже стоит на своем месте.
+        keys[k:k + la - i] = tmp[i:]
+        if vals is not None:
+            vals[k:k + la - i] = tmp_vals[i:]
+
+
+# Адаптивная естественная сортировка слиянием. Вход разбивается на готовые участки: неубывающие берутся как есть,
+# строго убывающие разворачиваются (строгость сохраняет устойчивость). Короткие участки дополняются до min_run
+# сортировкой вставками. Участки складываются в стек и сливаются так, чтобы их длины росли как числа Фибоначчи,
+# что держит слияния сбалансированными. Уже отсортированный вход обрабатывается за O(n).
+def natural_sort(s0: List[Any], key: Optional[Callable[[Any], Any]] = None, reverse: bool = False) -> List[Any]:
+    n = len(s0)
+    keys = list(s0) if key is None else [key(x) for x in s0]
+    vals = None if key is None else list(s0)
+    if reverse:
+        keys.reverse()
+        if vals is not None:
+            vals.reverse()
+
+    minrun, runs, lo = min_run(n), [], 0  # Стек участков (начало, длина).
+    while lo < n:
+        hi = lo + 1
+        if hi < n and keys[hi] < keys[lo]:  # Строго убывающий участок.
+            while hi < n and keys[hi] < keys[hi - 1]:
+                hi += 1
+            keys[lo:hi] = keys[lo:hi][::-1]
+            if vals is not None:
+                vals[lo:hi] = vals[lo:hi][::-1]
         else:
-            list_sort.insert(0, s2.pop())
+            while hi < n and not keys[hi] < keys[hi - 1]:
+                hi += 1
+        if hi - lo < minrun:
+            hi = min(lo + minrun, n)
+            insertion_sort(keys, lo, hi, vals)
+        runs.append((lo, hi - lo))
+        lo = hi
+
+        while len(runs) > 1:  # Восстановление баланса стека.
+            i = len(runs) - 2
+            if (i > 0 and runs[i - 1][1] <= runs[i][1] + runs[i + 1][1]) or \
+                    (i > 1 and runs[i - 2][1] <= runs[i - 1][1] + runs[i][1]):
+                if runs[i - 1][1] < runs[i + 1][1]:
+                    i -= 1
+            elif runs[i][1] > runs[i + 1][1]:
+                break
+            merge_runs(keys, runs[i][0], runs[i + 1][0], runs[i + 1][0] + runs[i + 1][1], vals)
+            runs[i:i + 2] = [(runs[i][0], runs[i][1] + runs[i + 1][1])]
 
-    if s1 or s2:
-        (list_sort := s1 + list_sort) if s1 else (list_sort := s2 + list_sort)
+    while len(runs) > 1:  # Слияние оставшихся участков с конца стека.
+        i = len(runs) - 2
+        if i > 0 and runs[i - 1][1] < runs[i + 1][1]:
+            i -= 1
+        merge_runs(keys, runs[i][0], runs[i + 1][0], runs[i + 1][0] + runs[i + 1][1], vals)
+        runs[i:i + 2] = [(runs[i][0], runs[i][1] + runs[i + 1][1])]
 
+    list_sort = keys if vals is None else vals
+    if reverse:
+        list_sort.reverse()
     return list_sort
 
 
-def sort(s0: List[int]) -> List[int]:
-    list_sort = []
+# Запись отсортированного участка во временный файл: в двоичном формате (pickle, любые объекты) или построчно
+# (строки без переводов строк).
+def write_run(items: Iterable[Any], path: str, binary: bool = True, buffer_size: int = 1 << 20) -> str:
+    if binary:
+        with open(path, 'wb', buffering=buffer_size) as file:
+            pickler = pickle.Pickler(file, pickle.HIGHEST_PROTOCOL)
+            for item in items:
+                pickler.dump(item)
+    else:
+        with open(path, 'w', encoding='utf-8', newline='\n', buffering=buffer_size) as file:
+            file.writelines(f'{item}\n' for item in items)
+    return path
+
+
+# Потоковое чтение участка, записанного "write_run", большими буферами.
+def read_run(path: str, binary: bool = True, buffer_size: int = 1 << 20) -> Iterator[Any]:
+    if binary:
+        with open(path, 'rb', buffering=buffer_size) as file:
+            unpickler = pickle.Unpickler(file)
+            while True:
+                try:
+                    yield unpickler.load()
+                except EOFError:
+                    return
+    else:
+        with open(path, encoding='utf-8', newline='\n', buffering=buffer_size) as file:  # Строки делятся только
+            # по '\n', символы '\r' внутри строк сохраняются.
+            for line in file:
+                yield line[:-1] if line.endswith('\n') else line
 
-    def inner(s1: List[int]) -> List[int]:
-        if len(s1) <= 1:
-            return s1
 
-        k = len(s1) // 2
-        s2, s3 = s1[:k], s1[k:]
+# Внешняя сортировка данных, не помещающихся в память. Вход читается порциями, пока их оценочный размер не
+# превысит "memory_limit", каждая порция сортируется "sort" и записывается во временный файл. Затем участки
+# сливаются кучей ("heapq.merge") не более чем по "fan_in" файлов за раз, последний проход отдается генератором.
+# Временные файлы удаляются по завершении или закрытии генератора.
+def external_sort(items: Iterable[Any], key: Optional[Callable[[Any], Any]] = None, reverse: bool = False,
+                  memory_limit: int = 64 << 20, binary: bool = True, fan_in: int = 64,
+                  temp_dir: Optional[str] = None, buffer_size: int = 1 << 20) -> Iterator[Any]:
+    with tempfile.TemporaryDirectory(dir=temp_dir) as directory:
+        runs, chunk, size = [], [], 0
+        for item in items:
+            chunk.append(item)
+            size += sys.getsizeof(item) + 24  # Сам объект и ссылки на него в порции, ключах и буфере слияния.
+            if size >= memory_limit:
+                runs.append(write_run(sort(chunk, key, reverse), os.path.join(directory, f'{len(runs)}.run'),
+                                      binary, buffer_size))
+                chunk, size = [], 0
+        if not runs:  # Все поместилось в память.
+            yield from sort(chunk, key, reverse)
+            return
+        if chunk:
+            runs.append(write_run(sort(chunk, key, reverse), os.path.join(directory, f'{len(runs)}.run'),
+                                  binary, buffer_size))
+        count = len(runs)
+        while len(runs) > fan_in:  # Промежуточные проходы: соседние группы участков сливаются по порядку.
+            merged = []
+            for i in range(0, len(runs), fan_in):
+                group = runs[i:i + fan_in]
+                merged.append(write_run(heapq.merge(*(read_run(run, binary, buffer_size) for run in group),
+                                                    key=key, reverse=reverse),
+                                        os.path.join(directory, f'{count}.run'), binary, buffer_size))
+                count += 1
+                for run in group:
+                    os.remove(run)
+            runs = merged
+        yield from heapq.merge(*(read_run(run, binary, buffer_size) for run in runs), key=key, reverse=reverse)
 
-        sorted_s2 = inner(s2)
-        sorted_s3 = inner(s3)
 
-        return merger_end(sorted_s2, sorted_s3)
+# Внешняя сортировка строк текстового файла в другой файл.
+def sort_file(src_path: str, dst_path: str, key: Optional[Callable[[str], Any]] = None, reverse: bool = False,
+              memory_limit: int = 64 << 20, buffer_size: int = 1 << 20) -> None:
+    with open(src_path, encoding='utf-8', newline='\n', buffering=buffer_size) as src, \
+            open(dst_path, 'w', encoding='utf-8', newline='\n', buffering=buffer_size) as dst:
+        lines = (line[:-1] if line.endswith('\n') else line for line in src)
+        dst.writelines(f'{line}\n' for line in external_sort(lines, key, reverse, memory_limit, False,
+                                                              buffer_size=buffer_size))
 
-    list_sort.append(inner(s0))
 
-    return list_sort[0]
+# Сортировка участка числового массива в разделяемой памяти (выполняется в процессе пула).
+def _sort_shared(name: str, typecode: str, lo: int, hi: int, reverse: bool) -> None:
+    memory = shared_memory.SharedMemory(name=name)
+    view = memory.buf.cast(typecode)
+    view[lo:hi] = array(typecode, sort(view[lo:hi].tolist(), reverse=reverse))
+    view.release()
+    memory.close()
+
+
+# Сортировка части списка (выполняется в процессе пула, данные передаются сериализацией).
+def _sort_part(part: List[Any], key: Optional[Callable[[Any], Any]], reverse: bool) -> List[Any]:
+    return sort(part, key, reverse)
+
+
+# Код типа массива для однородных числовых данных: 'q' - целые в пределах int64, 'd' - вещественные.
+def _numeric_typecode(s0: List[Any]) -> Optional[str]:
+    if all(type(x) is int for x in s0):
+        return 'q' if -2 ** 63 <= min(s0) and max(s0) < 2 ** 63 else None
+    if all(type(x) is float for x in s0):
+        return 'd'
+    return None
+
+
+# Параллельная сортировка слиянием: вход делится на равные части по числу процессов, части сортируются в пуле и
+# затем сливаются кучей. Числа без "key" передаются через разделяемую память, остальные данные - сериализацией.
+# Если задан "key", ключи вычисляются в текущем процессе, и в пул передаются пары (ключ, позиция): сама функция
+# "key" не сериализуется, поэтому подходят и lambda, и локальные функции, как в "sort".
+# Меньше "threshold" элементов (или при одном процессе) сортировка выполняется в текущем процессе.
+def parallel_sort(s0: List[Any], key: Optional[Callable[[Any], Any]] = None, reverse: bool = False,
+                  workers: Optional[int] = None, threshold: int = 100_000) -> List[Any]:
+    workers = workers or os.cpu_count() or 1
+    n = len(s0)
+    if n < threshold or workers < 2:
+        return sort(s0, key, reverse)
+    bounds: List[Tuple[int, int]] = [(n * i // workers, n * (i + 1) // workers) for i in range(workers)]
+    typecode = _numeric_typecode(s0) if key is None else None
+    items, part_key = s0, None
+    if key is not None:
+        items, part_key = [(key(x), i) for i, x in enumerate(s0)], itemgetter(0)
+    with ProcessPoolExecutor(workers) as pool:
+        if typecode is None:
+            parts = list(pool.map(_sort_part, [items[lo:hi] for lo, hi in bounds], [part_key] * workers,
+                                  [reverse] * workers))
+        else:
+            memory = shared_memory.SharedMemory(create=True, size=n * 8)
+            try:
+                view = memory.buf.cast(typecode)
+                view[:n] = array(typecode, s0)
+                list(pool.map(_sort_shared, [memory.name] * workers, [typecode] * workers,
+                              [lo for lo, _ in bounds], [hi for _, hi in bounds], [reverse] * workers))
+                parts = [view[lo:hi].tolist() for lo, hi in bounds]
+                view.release()
+            finally:
+                memory.close()
+                memory.unlink()
+    if key is not None:
+        return [s0[i] for _, i in heapq.merge(*parts, key=part_key, reverse=reverse)]
+    return list(heapq.merge(*parts, reverse=reverse))
 
 
 if __name__ == '__main__':